@@ -0,0 +1,171 @@
+"""
+cluster_worker.py
+=================
+Runs the dendrogram fit (scipy linkage) in a separate process so a big
+recluster does not hold the GIL away from the Flask UI, SSE streams and
+the watcher threads.
+
+The embedding matrix is handed over in a shared-memory segment: the
+parent writes it once, the worker maps the same pages and runs linkage on
+them in place. Only the linkage matrix Z ((n-1) × 4) travels back over the
+pipe.
+
+The worker is a plain `python cluster_worker.py` child (not a
+multiprocessing child), so it never re-imports main.py and the embedding
+model. If it cannot be started or dies mid-fit, fit() falls back to an
+in-process linkage.
+
+Usage:
+    Z = cluster_worker.fit(embeddings)        # same result as linkage(...)
+    cluster_worker.shutdown()
+"""
+
+import os
+import pickle
+import subprocess
+import sys
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy.cluster.hierarchy import linkage
+
+import metrics
+
+ENABLED = os.environ.get("SEFS_CLUSTER_WORKER", "1") not in ("0", "false")
+MIN_FILES = 500   # below this the process hop costs more than it saves
+
+FALLBACKS = metrics.counter(
+    "sefs_cluster_worker_fallbacks_total", "Fits run in-process because the worker failed"
+)
+
+
+class ClusterWorker:
+    def __init__(self):
+        self._proc = None
+        self._lock = threading.Lock()   # one fit at a time per worker
+
+    def _ensure(self):
+        if self._proc is not None and self._proc.poll() is None:
+            return self._proc
+        self._proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        print(f"[ClusterWorker] started pid {self._proc.pid}")
+        return self._proc
+
+    def fit(self, embeddings, method="average", metric="cosine"):
+        X = np.ascontiguousarray(embeddings, dtype=np.float64)
+        with self._lock:
+            proc = self._ensure()
+            shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+            try:
+                view = np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)
+                view[:] = X
+                del view
+                _send(proc.stdin, ("linkage", shm.name, X.shape, X.dtype.str, method, metric))
+                status, payload = _recv(proc.stdout)
+            except (OSError, EOFError, pickle.UnpicklingError) as e:
+                self._kill()
+                raise RuntimeError(f"cluster worker died: {e}") from e
+            finally:
+                shm.close()
+                shm.unlink()
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def _kill(self):
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    def shutdown(self):
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                return
+            try:
+                _send(self._proc.stdin, ("stop",))
+                self._proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._kill()
+            self._proc = None
+
+
+WORKER = ClusterWorker()
+
+
+def fit(embeddings, method="average", metric="cosine"):
+    """linkage(embeddings) computed in the worker process when worthwhile,
+    in-process otherwise or if the worker fails."""
+    if ENABLED and len(embeddings) >= MIN_FILES:
+        try:
+            return WORKER.fit(embeddings, method, metric)
+        except Exception as e:
+            FALLBACKS.inc()
+            print(f"[ClusterWorker] {e} — clustering in-process")
+    return linkage(np.asarray(embeddings, dtype=np.float64), method=method, metric=metric)
+
+
+def shutdown():
+    WORKER.shutdown()
+
+
+# =============================
+# Wire format: length-prefixed pickles over the child's stdin/stdout
+# =============================
+def _send(stream, msg):
+    data = pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(len(data).to_bytes(8, "little") + data)
+    stream.flush()
+
+
+def _recv(stream):
+    header = stream.read(8)
+    if len(header) < 8:
+        raise EOFError("worker closed the pipe")
+    return pickle.loads(stream.read(int.from_bytes(header, "little")))
+
+
+# =============================
+# Worker process
+# =============================
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix":
+        # the parent owns and unlinks the segment; stop this process's
+        # resource tracker from unlinking it again (and warning) at exit
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _serve():
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr   # stray prints must not corrupt the protocol
+    while True:
+        try:
+            msg = _recv(stdin)
+        except EOFError:
+            return
+        if msg[0] == "stop":
+            return
+        _, name, shape, dtype, method, metric = msg
+        try:
+            shm = _attach(name)
+            try:
+                X = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+                Z = linkage(X, method=method, metric=metric)
+                del X
+            finally:
+                shm.close()
+            reply = ("ok", Z)
+        except Exception as e:
+            reply = ("error", repr(e))
+        _send(stdout, reply)
+
+
+if __name__ == "__main__":
+    _serve()
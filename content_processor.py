@@ -1,14 +1,68 @@
 import hashlib
 import time
 import os
+import threading
+from collections import OrderedDict
+from queue import Queue, Empty
 import fitz
 import pandas as pd
 from docx import Document
 from sentence_transformers import SentenceTransformer
 from semantic_intelligence import FILES
+from tfidf_naming import doc_terms, release_terms
+import metrics
 
 MODEL = SentenceTransformer("all-MiniLM-L6-v2")
 
+
+class EmbeddingService:
+    """The one place MODEL.encode runs. Every root's embed stage (and the
+    prototype namer) calls encode(); a single thread folds whatever
+    requests are waiting into one batch, so many roots share one model
+    copy and still get batched inference."""
+
+    def __init__(self, model, max_batch=64):
+        self.model = model
+        self.max_batch = max_batch
+        self._requests = Queue()
+        threading.Thread(target=self._run, name="embedder", daemon=True).start()
+
+    def encode(self, texts):
+        done = threading.Event()
+        request = {"texts": list(texts), "done": done, "vectors": None, "error": None}
+        self._requests.put(request)
+        done.wait()
+        if request["error"] is not None:
+            raise request["error"]
+        return request["vectors"]
+
+    def _run(self):
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0]["texts"])
+            while size < self.max_batch:
+                try:
+                    request = self._requests.get_nowait()
+                except Empty:
+                    break
+                batch.append(request)
+                size += len(request["texts"])
+            try:
+                with metrics.timed("embed_batch"):
+                    vectors = self.model.encode([t for r in batch for t in r["texts"]])
+                i = 0
+                for r in batch:
+                    r["vectors"] = vectors[i:i + len(r["texts"])]
+                    i += len(r["texts"])
+            except Exception as e:
+                for r in batch:
+                    r["error"] = e
+            for r in batch:
+                r["done"].set()
+
+
+EMBEDDER = EmbeddingService(MODEL)
+
 SUPPORTED_EXTENSIONS = (
     ".pdf", ".txt", ".docx", ".csv",
     ".md", ".py", ".java", ".cpp", ".c", ".js"
@@ -55,33 +109,140 @@ def file_hash(path):
     with open(path, "rb") as f:
         return hashlib.md5(f.read()).hexdigest()
 
-def process_file(path, root_dir):
-    path = str(path)
+def remove_file(path, root_dir, files=None):
+    files = FILES if files is None else files
+    entry = files.pop(str(path), None)
+    if entry:
+        release_terms(entry.get("terms"))
+    # link organize modes: drop the file's link from the organized tree
+    link = entry.get("link") if entry else None
+    if link and os.path.lexists(link):
+        try:
+            os.unlink(link)
+        except OSError as e:
+            print("[Link Error]", e)
+
+# =============================
+# Pipeline stages (wired up in main.build_pipeline)
+# A job is a dict: {"event", "src", "path", "text", "hash", "embedding", "t0"}
+# plus "files", the FileStore of the root it belongs to (default FILES).
+# Each stage returns the job for the next stage, or None to drop it.
+# =============================
+EMBED_CACHE_SIZE = 2048
+
+_embed_cache = OrderedDict()   # content hash -> embedding (LRU)
+_embed_cache_lock = threading.Lock()
+
+
+def is_supported(path):
+    path = str(path).lower()
+    return path.endswith(SUPPORTED_EXTENSIONS) and not path.endswith(IGNORE_EXTENSIONS)
+
+
+# Rough extraction throughput in bytes/second, used only to order work.
+EXTRACT_RATE = {".pdf": 2e6, ".docx": 5e6, ".csv": 10e6}
+DEFAULT_EXTRACT_RATE = 50e6
+MOVE_RATE = 200e6
+SMALL_FILE = 1 << 20
+SMALL_FILE_POLL = 0.25   # seconds between size checks for files under SMALL_FILE
+
+
+def estimate_cost(path, size=None):
+    """Estimated seconds of ingest work for a file (size- and format-aware)."""
+    if size is None:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return 0.0
+
+    path = str(path).lower()
+    if not is_supported(path):
+        return size / MOVE_RATE
+
+    ext = os.path.splitext(path)[1]
+    return 0.05 + size / EXTRACT_RATE.get(ext, DEFAULT_EXTRACT_RATE)
+
+
+def stabilize_job(job):
+    src = job["src"]
+    try:
+        st = os.stat(src)
+    except OSError:
+        return None
 
-    if not path.startswith(str(root_dir)):
-        return
+    # always poll: copies that preserve mtime (cp -p, copy2, rsync -t) look
+    # old from the first byte. Small files are polled faster so they reach
+    # the tree sooner.
+    delay = SMALL_FILE_POLL if st.st_size < SMALL_FILE else 1.0
+    if not wait_until_stable(src, delay=delay):
+        return None
+    try:
+        st = os.stat(src)
+    except OSError:
+        return None
 
-    if not path.lower().endswith(SUPPORTED_EXTENSIONS):
-        return
+    job["cost"] = estimate_cost(src, st.st_size)
+    return job
 
-    if path.lower().endswith(IGNORE_EXTENSIONS):
-        return
 
-    if not wait_until_stable(path):
-        return
+def extract_job(job):
+    path = job["path"]
+    if not is_supported(path):
+        return None
 
     text = extract_text(path)
     if not text.strip():
-        return
+        return None
+
+    job["text"] = text
+    job["terms"] = doc_terms(text)   # sparse counts for class TF-IDF naming
+    return job
+
+
+def hash_job(job):
+    """Hash the content and reuse the embedding of identical content."""
+    job["hash"] = file_hash(job["path"])
+    with _embed_cache_lock:
+        cached = _embed_cache.get(job["hash"])
+        if cached is not None:
+            _embed_cache.move_to_end(job["hash"])
+    job["embedding"] = cached
+    return job
 
+
+def embed_jobs(jobs):
+    """Batched stage: one shared-model call for every job still missing an embedding."""
+    todo = [j for j in jobs if j.get("embedding") is None]
+    if todo:
+        vectors = EMBEDDER.encode([j["text"] for j in todo])
+        for job, vector in zip(todo, vectors):
+            job["embedding"] = vector
+    return jobs
+
+
+def index_job(job):
+    path = job["path"]
     print(f"[Content] Processing {path}")
 
-    FILES[path] = {
-        "hash": file_hash(path),
-        "embedding": MODEL.encode(text),
-        "text": text,
-        "cluster": None
-    }
+    files = job.get("files", FILES)
+
+    # re-indexed in place (link/virtual modes): keep its organized location
+    prev = files.get(path) or {}
 
-def remove_file(path, root_dir):
-    FILES.pop(str(path), None)
+    files[path] = {
+        "hash": job["hash"],
+        "embedding": job["embedding"],
+        "text": job["text"],
+        "terms": job["terms"],
+        "cluster": None,
+        "placement": prev.get("placement") or job.get("placement"),
+        "link": prev.get("link"),
+    }
+    release_terms(prev.get("terms"))
+
+    with _embed_cache_lock:
+        _embed_cache[job["hash"]] = job["embedding"]
+        _embed_cache.move_to_end(job["hash"])
+        while len(_embed_cache) > EMBED_CACHE_SIZE:
+            _embed_cache.popitem(last=False)
+    return job
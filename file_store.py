@@ -0,0 +1,158 @@
+"""
+file_store.py
+=============
+Thread-safe, versioned replacement for the plain FILES dict.
+
+Ingest keeps writing while a recluster works on a point-in-time
+snapshot. Every write bumps a global version and stamps the entry, so
+when the recluster applies its results it can tell which entries changed
+underneath it and hand those back for the next run instead of racing.
+
+Entries are treated as immutable: writers replace them (put / update)
+rather than mutating the dict in place, so a snapshot never sees a
+half-written entry.
+"""
+
+import threading
+
+
+class Snapshot:
+    """Point-in-time view of the store: a shallow copy plus its version."""
+
+    def __init__(self, version, data):
+        self.version = version
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, path):
+        return self.data[path]
+
+    def __contains__(self, path):
+        return path in self.data
+
+    def keys(self):
+        return list(self.data.keys())
+
+    def items(self):
+        return list(self.data.items())
+
+
+class FileStore:
+    def __init__(self):
+        self._data = {}            # path -> entry dict
+        self._stamp = {}           # path -> version of its last write
+        self._lock = threading.RLock()
+        self._listeners = []
+        self.version = 0
+
+    # ---------- reads ----------
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, path):
+        return path in self._data
+
+    def __getitem__(self, path):
+        return self._data[path]
+
+    def get(self, path, default=None):
+        return self._data.get(path, default)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def values(self):
+        with self._lock:
+            return list(self._data.values())
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def stamp(self, path):
+        return self._stamp.get(path)
+
+    def snapshot(self):
+        with self._lock:
+            return Snapshot(self.version, dict(self._data))
+
+    def changed_since(self, version, path):
+        """True if `path` was written or removed after `version`."""
+        with self._lock:
+            if path not in self._data:
+                return True
+            return self._stamp.get(path, 0) > version
+
+    def subscribe(self, fn):
+        """Call fn(op, path, new_path, entry) on every write (under the store
+        lock, so in version order; entry is None for removals). Returns the
+        (path, entry) items present at subscription time, atomically with
+        registering, so the subscriber can bootstrap."""
+        with self._lock:
+            self._listeners.append(fn)
+            return list(self._data.items())
+
+    # ---------- writes ----------
+    def _bump(self, op, path, new_path=None, entry=None):
+        self.version += 1
+        for fn in self._listeners:
+            try:
+                fn(op, path, new_path, entry)
+            except Exception as e:
+                print("[FileStore] listener error:", e)
+        return self.version
+
+    def __setitem__(self, path, entry):
+        self.put(path, entry)
+
+    def put(self, path, entry):
+        with self._lock:
+            op = "update" if path in self._data else "put"
+            self._data[path] = entry
+            self._stamp[path] = self._bump(op, path, entry=entry)
+
+    def update(self, path, **fields):
+        """Copy-on-write update of some fields of an existing entry."""
+        with self._lock:
+            entry = self._data.get(path)
+            if entry is None:
+                return False
+            entry = self._data[path] = {**entry, **fields}
+            self._stamp[path] = self._bump("update", path, entry=entry)
+            return True
+
+    def pop(self, path, default=None):
+        with self._lock:
+            if path not in self._data:
+                return default
+            entry = self._data.pop(path)
+            self._stamp.pop(path, None)
+            self._bump("remove", path)
+            return entry
+
+    def rename(self, old, new, since=None, **fields):
+        """Re-key an entry after its file was moved.
+
+        The entry always follows the file. `fields` are applied only if the
+        entry was not rewritten after version `since` (a stale recluster
+        result must not overwrite fresh ingest data). Returns True when the
+        rename was clean, False when the entry is missing or was modified
+        concurrently.
+        """
+        with self._lock:
+            entry = self._data.pop(old, None)
+            if entry is None:
+                return False
+            stamp = self._stamp.pop(old, 0)
+            clean = since is None or stamp <= since
+            if clean and fields:
+                entry = {**entry, **fields}
+            self._data[new] = entry
+            self._stamp[new] = self._bump("rename", old, new, entry)
+            return clean
@@ -10,6 +10,11 @@ class SEFSHandler(FileSystemEventHandler):
         if event.is_directory:
             return
 
+        # newer watchdog also reports opened/closed; reading a file for
+        # ingest must not look like a change to it
+        if event.event_type not in ("created", "modified", "moved", "deleted"):
+            return
+
         if event.event_type == "deleted":
             self.queue.put(("deleted", event.src_path, None))
         elif event.event_type == "moved":
@@ -17,15 +22,18 @@ class SEFSHandler(FileSystemEventHandler):
         else:
             self.queue.put(("modified", event.src_path, None))
 
-def start_watcher(root, queue):
+def start_watcher(root, queue, stop_event=None):
+    # queue.put blocks when a bounded queue is full, which holds watchdog's
+    # dispatch thread back until the ingest pipeline catches up.
     observer = Observer()
     observer.schedule(SEFSHandler(queue), str(root), recursive=True)
     observer.start()
 
     try:
-        while True:
+        while not (stop_event and stop_event.is_set()):
             time.sleep(1)
     except KeyboardInterrupt:
-        observer.stop()
+        pass
 
+    observer.stop()
     observer.join()
@@ -101,145 +101,412 @@ Input folder  → ROOT_IN
 Structured out → ROOT_OUT
 UI shows ROOT_OUT
 
+Several input/output pairs can be served by one process (ROOTS below).
+They share the embedding model; each root has its own event queue,
+ingest pipeline, recluster scheduler and FILES namespace.
+
 Usage:  python main.py
 UI:     http://localhost:5000
 """
 import os
+import time
 import threading
-import shutil
 from queue import Queue
 from pathlib import Path
 
 # ── modules ───────────────────────────────────────────────
 from file_watcher import start_watcher
-from content_processor import process_file, remove_file
-from semantic_intelligence import reorganize_files
+from content_processor import (
+    stabilize_job, extract_job, hash_job, embed_jobs, index_job, estimate_cost,
+    remove_file, is_supported
+)
+from semantic_intelligence import corpus, reorganize_files, assign_incremental
+from tfidf_naming import release_terms
+from pipeline import PARKED, Pipeline, Stage
+from recluster import ReclusterScheduler
 import ui_server
+import metrics
+import tracing
+import transfer
+import cluster_worker
+import remote_workers
+import replay
 
 # ──────────────────────────────────────────────────────────
 ROOT_IN  = Path(r"C:\Users\Daiwi\OneDrive\Documents\bands\SEFS_-BANDS-\root1")
 ROOT_OUT = Path(r"C:\Users\Daiwi\OneDrive\Documents\bands\SEFS_-BANDS-\root2")
-# ──────────────────────────────────────────────────────────
-
-event_queue = Queue()
-recluster_timer = None
-lock = threading.Lock()
 
+# How the organized hierarchy is produced:
+#   "move"     → files are moved into ROOT_OUT/domain/cluster (original behaviour)
+#   "symlink"  → originals stay in ROOT_IN; ROOT_OUT holds symlinks
+#   "hardlink" → same with hardlinks (falls back to symlinks across devices)
+#   "virtual"  → nothing is written; the hierarchy lives only in the UI/API
+ORGANIZE_MODE = "move"
+
+# Every watched share: name → (input root, output root[, organize mode]).
+# Add entries to serve more shares from this process.
+ROOTS = {
+    "default": (ROOT_IN, ROOT_OUT),
+}
+# ──────────────────────────────────────────────────────────
 
-# ==========================================================
-# Debounced recluster (longer delay to avoid race)
-# ==========================================================
-def schedule_recluster():
-    global recluster_timer
+# ── pipeline sizing (per root) ────────────────────────────
+EVENT_QUEUE_SIZE = 256     # watcher blocks once this many events are pending
+INTAKE_QUEUE_SIZE = 4096   # stabilize queue: large so priority can reorder a bulk drop
+STAGE_QUEUE_SIZE = 64
+MAX_PRIORITY_DELAY = 30.0  # aging bound: no job is deprioritised by more than this
+EMBED_BATCH_SIZE = 16
+PIPELINE_WORKERS = {
+    "stabilize":  8,                      # mostly sleeping in wait_until_stable
+    "stage_move": 2,
+    "extract":    max(2, (os.cpu_count() or 2) - 1),
+    "hash":       2,
+    "embed":      1,                      # batched; feeds the shared EmbeddingService
+    "index":      1,                      # single writer into the root's FILES
+}
+
+# ── recluster scheduling ──────────────────────────────────
+RECLUSTER_MIN_INTERVAL = 2.0   # seconds between the end of one run and the next
+RECLUSTER_MAX_WAIT = 30.0      # a change never waits longer than this
+# ──────────────────────────────────────────────────────────
 
-    with lock:
-        if recluster_timer:
-            recluster_timer.cancel()
+# ── remote extraction/embedding (remote_workers.py) ───────
+# Workers on other boxes pull extract + encode batches over HTTP:
+#   python remote_workers.py worker --url http://<this host>:5001
+REMOTE_INGEST = os.environ.get("SEFS_REMOTE", "") not in ("", "0", "false")
+REMOTE_HOST = "127.0.0.1"      # "0.0.0.0" to accept workers from other machines
+REMOTE_PORT = 5001
+REMOTE_TOKEN = os.environ.get("SEFS_WORKER_TOKEN")
+REMOTE_LOCAL_WORKERS = int(os.environ.get("SEFS_REMOTE_LOCAL", "0"))   # spawn N here (testing)
+# ──────────────────────────────────────────────────────────
 
-        def _do():
-            print("[Semantic] Reclustering now...")
-            reorganize_files(ROOT_OUT)
-            ui_server.broadcast("reorganized", ROOT_OUT)
+# ── event recording (replay.py) ───────────────────────────
+RECORD_FILE = os.environ.get("SEFS_RECORD")          # e.g. session.jsonl
+RECORD_BLOBS = os.environ.get("SEFS_RECORD_BLOBS", "") not in ("", "0", "false")
+# ──────────────────────────────────────────────────────────
 
-        # longer delay → let embeddings + pdf parsing finish
-        recluster_timer = threading.Timer(8.0, _do)
-        recluster_timer.start()
+INGEST_LATENCY = metrics.histogram(
+    "sefs_ingest_latency_seconds",
+    "Time from event dispatch to indexed in FILES (or dropped)", ("root", "outcome")
+)
 
+roots = {}   # name -> Root, filled by main()
 
-# ==========================================================
-# Move file to ROOT_OUT staging first
-# ==========================================================
-def move_to_output(src_path):
-    src = Path(src_path)
-    if not src.exists():
-        return None
+metrics.gauge("sefs_queue_depth", "Events waiting in event_queue", ("root",)).set_function(
+    lambda: {name: r.event_queue.qsize() for name, r in roots.items()}
+)
 
-    dst = ROOT_OUT / src.name
 
-    try:
-        shutil.move(str(src), str(dst))
-        print(f"[SEFS] Staged → {dst}")
-        return dst
-    except Exception as e:
-        print("[Move Error]", e)
+def record_file_for(name):
+    """SEFS_RECORD as given for a single root, session.<name>.jsonl otherwise."""
+    if not RECORD_FILE:
         return None
+    if len(ROOTS) == 1:
+        return RECORD_FILE
+    path = Path(RECORD_FILE)
+    return str(path.with_name(f"{path.stem}.{name}{path.suffix}"))
 
 
 # ==========================================================
-# Event Processor
+# One watched share: ROOT_IN → pipeline → FILES namespace → ROOT_OUT
 # ==========================================================
-def event_processor():
-    while True:
-        event, src, dst = event_queue.get()
-
-        try:
-            if event == "deleted":
+class Root:
+    def __init__(self, name, root_in, root_out, mode=ORGANIZE_MODE, record_file=None):
+        self.name = name
+        self.root_in = Path(root_in)
+        self.root_out = Path(root_out)
+        self.mode = mode
+        self.files = corpus(self.root_out, name).files
+
+        if record_file:
+            self.event_queue = replay.RecordingQueue(
+                EVENT_QUEUE_SIZE,
+                replay.Recorder(record_file, self.root_in, blobs=RECORD_BLOBS,
+                                organize_mode=mode, name=name),
+            )
+        else:
+            self.event_queue = Queue(maxsize=EVENT_QUEUE_SIZE)
+
+        self.pipeline = None
+        self.ingest_stage = "extract"   # where staged jobs continue ("remote" with workers)
+        self.scheduler = None
+        self._dispatcher = None
+        self._watcher = None
+        self._watcher_stop = threading.Event()
+
+    # ------------------------------------------------------
+    # Adaptive recluster (see recluster.py)
+    # ------------------------------------------------------
+    def build_recluster_scheduler(self):
+        def _full():
+            print(f"[Semantic] Reclustering {self.name} now...")
+            return reorganize_files(self.root_out, mode=self.mode)
+
+        def _done(mode):
+            ui_server.broadcast("reorganized", self.root_out)
+
+        return ReclusterScheduler(
+            full_fn=_full,
+            incremental_fn=lambda paths: assign_incremental(self.root_out, paths, mode=self.mode),
+            total_fn=lambda: len(self.files),
+            min_interval=RECLUSTER_MIN_INTERVAL,
+            max_wait=RECLUSTER_MAX_WAIT,
+            on_done=_done,
+            name=self.name,
+        )
+
+    def schedule_recluster(self, path=None):
+        self.scheduler.notify(path)
+
+    # ------------------------------------------------------
+    # Move file to ROOT_OUT staging first ("move" mode only)
+    # ------------------------------------------------------
+    def move_to_output(self, src_path, on_done=None):
+        """Hand the file to the transfer engine. Returns the Transfer (already
+        finished for a same-device rename, still copying otherwise) or None."""
+        src = Path(src_path)
+        if not src.exists():
+            return None
+
+        dst = self.root_out / src.name
+
+        t = transfer.move(src, dst, on_done=on_done)
+        if t.ok:
+            print(f"[SEFS] Staged → {dst}")
+        return t
+
+    # ------------------------------------------------------
+    # Ingest pipeline
+    # stabilize → stage/move → extract → hash/dedupe → embed → index
+    # (with remote workers: stage/move → remote → index, extract... as fallback)
+    # ------------------------------------------------------
+    def stage_job(self, job):
+        if self.mode != "move":
+            # originals stay put; unclustered files show up as Unsorted
+            job["path"] = job["src"]
+            job["placement"] = ("Unsorted", "Files")
+            return job
+
+        def _resume(t):
+            # cross-device copy landed on a transfer worker: rejoin after this stage
+            if t.is_same_device:
+                return
+            if t.ok:
+                job["path"] = str(t.dst)
+                self.pipeline.stage(self.ingest_stage).put(job)
+            else:
+                self.drop_job("stage_move", job)
+
+        t = self.move_to_output(job["src"], on_done=_resume)
+        if t is None or t.state == "failed" or t.on_done is not _resume:
+            return None   # gone, failed, or another event's transfer already has it
+        if not t.is_same_device:
+            return PARKED   # copying in the background until _resume
+        job["path"] = str(t.dst)
+        return job
+
+    def remote_job(self, job):
+        """Park the job with the remote workers; it rejoins at index, or at
+        extract when it has to be processed here after all."""
+        if not is_supported(job["path"]):
+            return None   # same filter extract_job applies; dropped via on_drop
+        remote_workers.coordinator().submit(
+            job,
+            on_done=self.pipeline.stage("index").put,
+            on_fail=self.pipeline.stage("extract").put,
+            owner=self.name,
+            on_drop=lambda job: self.drop_job("remote", job),
+        )
+        return PARKED
+
+    def finish_job(self, job):
+        index_job(job)
+        INGEST_LATENCY.observe(time.time() - job["t0"], root=self.name, outcome="indexed")
+        tracing.complete("event", job["t0"], cat="ingest", event=job["event"],
+                         src=job["src"], root=self.name)
+        self.schedule_recluster(job["path"])
+        return job
+
+    def drop_job(self, stage, job):
+        """A job left the pipeline without being indexed (file vanished,
+        unsupported, extract failed...). The tree may still have changed."""
+        release_terms(job.pop("terms", None))
+        INGEST_LATENCY.observe(time.time() - job["t0"], root=self.name, outcome="dropped")
+        tracing.complete("event", job["t0"], cat="ingest", event=job["event"],
+                         src=job["src"], root=self.name, dropped=stage)
+        self.schedule_recluster()
+
+    def wait_ingest_idle(self):
+        """pipeline.join() that also covers jobs parked in background transfers
+        and with remote workers."""
+        self.pipeline.join()
+        transfer.wait_idle()
+        if self.ingest_stage == "remote":
+            while True:
+                remote_workers.coordinator().wait_idle(owner=self.name)
+                self.pipeline.join()
+                if remote_workers.coordinator().wait_idle(owner=self.name, timeout=0):
+                    break
+        self.pipeline.join()
+
+    def build_pipeline(self):
+        # every stage is cost-ordered (cheapest first, with aging) so a small
+        # file dropped mid bulk-import overtakes the large ones at each step
+        w = PIPELINE_WORKERS
+        prio = {"cost": job_cost, "max_delay": MAX_PRIORITY_DELAY}
+        remote = []
+        if remote_workers.coordinator() is not None:
+            # non-blocking hand-off; extract/hash/embed stay as the local fallback
+            self.ingest_stage = "remote"
+            remote = [Stage("remote", self.remote_job, 1, STAGE_QUEUE_SIZE, **prio)]
+        return Pipeline([
+            Stage("stabilize",  stabilize_job,    w["stabilize"],  INTAKE_QUEUE_SIZE, **prio),
+            Stage("stage_move", self.stage_job,   w["stage_move"], STAGE_QUEUE_SIZE, **prio),
+            *remote,
+            Stage("extract",    extract_job,      w["extract"],    STAGE_QUEUE_SIZE, **prio),
+            Stage("hash",       hash_job,         w["hash"],       STAGE_QUEUE_SIZE, **prio),
+            Stage("embed",      embed_jobs,       w["embed"],      STAGE_QUEUE_SIZE,
+                  batch_size=EMBED_BATCH_SIZE, **prio),
+            Stage("index",      self.finish_job,  w["index"],      STAGE_QUEUE_SIZE),
+        ], name=self.name, on_drop=self.drop_job)
+
+    def submit_path(self, event, path):
+        self.pipeline.submit({
+            "event": event,
+            "src": str(path),
+            "t0": time.time(),
+            "cost": estimate_cost(path),
+            "files": self.files,
+        })
+
+    # ------------------------------------------------------
+    # Event dispatcher: event_queue → pipeline
+    # ------------------------------------------------------
+    def event_processor(self):
+        while True:
+            item = self.event_queue.get()
+            if item is None:   # shutdown sentinel
+                return
+
+            event, src, dst = item
+            metrics.EVENTS_TOTAL.inc(event=event)
+
+            if self.mode != "move" and event in ("deleted", "moved"):
+                # files are indexed in place, so ROOT_IN deletes/renames matter
+                remove_file(src, self.root_in, self.files)
+                self.schedule_recluster()
+                if event == "deleted":
+                    continue
+
+            elif event == "deleted":
                 # ignore — we already moved it
                 continue
 
-            elif event == "moved":
-                new_path = move_to_output(dst)
-                if new_path:
-                    process_file(new_path, ROOT_OUT)
-
-            else:  # created / modified
-                new_path = move_to_output(src)
-                if new_path:
-                    process_file(new_path, ROOT_OUT)
-
-        except Exception as e:
-            print(f"[SEFS] Error {event} {src}: {e}")
-
-        finally:
-            schedule_recluster()
+            try:
+                self.submit_path(event, dst if event == "moved" else src)
+            except Exception as e:
+                print(f"[SEFS] Error {event} {src}: {e}")
+
+    # ------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------
+    def start(self, watch=True, scan=True):
+        self.root_out.mkdir(parents=True, exist_ok=True)
+        print(f"[SEFS] {self.name}: watching {self.root_in} → {self.root_out}")
+
+        self.scheduler = self.build_recluster_scheduler().start()
+        self.pipeline = self.build_pipeline().start()
+
+        # -------- Initial scan of ROOT_IN ----------
+        moved_any = False
+        if scan:
+            for root, _, files in os.walk(self.root_in):
+                for f in files:
+                    if isinstance(self.event_queue, replay.RecordingQueue):
+                        self.event_queue.recorder.record("created", str(Path(root) / f))
+                    self.submit_path("created", Path(root) / f)
+                    moved_any = True
+
+        # -------- Force first clustering if files exist ----------
+        if moved_any:
+            self.wait_ingest_idle()
+            print(f"[SEFS] {self.name}: initial scan complete — clustering")
+            self.scheduler.request_full()
+
+        self._dispatcher = threading.Thread(
+            target=self.event_processor, name=f"dispatch-{self.name}", daemon=True
+        )
+        self._dispatcher.start()
+
+        if watch:
+            self._watcher = threading.Thread(
+                target=start_watcher,
+                args=(self.root_in, self.event_queue, self._watcher_stop),
+                name=f"watch-{self.name}",
+                daemon=True
+            )
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        """Graceful drain: stop new events, flush what was accepted."""
+        self._watcher_stop.set()
+        if self._watcher:
+            self._watcher.join(timeout=5)
+        self.event_queue.put(None)
+        self._dispatcher.join()
+        self.wait_ingest_idle()
+        self.pipeline.shutdown(drain=True)
+        self.scheduler.stop()
+        if isinstance(self.event_queue, replay.RecordingQueue):
+            self.event_queue.recorder.close()
+
+
+def job_cost(job):
+    return job.get("cost", 0.0)
 
 
 # ==========================================================
 # Main
 # ==========================================================
 def main():
+    if REMOTE_INGEST:
+        remote_workers.start(REMOTE_HOST, REMOTE_PORT, REMOTE_TOKEN, REMOTE_LOCAL_WORKERS)
 
-    ROOT_OUT.mkdir(parents=True, exist_ok=True)
-
-    print(f"[SEFS] Watching INPUT  : {ROOT_IN}")
-    print(f"[SEFS] Writing OUTPUT : {ROOT_OUT}")
-
-    # -------- Initial scan of ROOT_IN ----------
-    moved_any = False
+    for name, spec in ROOTS.items():
+        root_in, root_out, *mode = spec
+        roots[name] = Root(name, root_in, root_out, mode[0] if mode else ORGANIZE_MODE,
+                           record_file=record_file_for(name))
 
-    for root, _, files in os.walk(ROOT_IN):
-        for f in files:
-            try:
-                src = Path(root) / f
-                dst = ROOT_OUT / src.name
-                shutil.move(str(src), str(dst))
-                print(f"[SEFS] Initial stage → {dst}")
-                process_file(dst, ROOT_OUT)
-                moved_any = True
-            except Exception as e:
-                print(f"[SEFS] Skip {f}: {e}")
-
-    # -------- Force first clustering if files exist ----------
-    if moved_any:
-        print("[SEFS] Initial scan complete — clustering")
-        reorganize_files(ROOT_OUT)
-
-    # -------- Threads ----------
-    threading.Thread(target=event_processor, daemon=True).start()
+    # initial scans run concurrently; each root waits only for its own files
+    starters = [threading.Thread(target=r.start) for r in roots.values()]
+    for t in starters:
+        t.start()
+    for t in starters:
+        t.join()
 
-    threading.Thread(
-        target=start_watcher,
-        args=(ROOT_IN, event_queue),
-        daemon=True
-    ).start()
+    print("[SEFS] Drop files into the input roots")
 
-    print("[SEFS] Drop files into ROOT_IN")
-    print("[SEFS UI] http://localhost:5000")
-
-    # -------- UI shows ROOT_OUT ----------
-    ui_server.run(ROOT_OUT, port=5000)
+    # -------- UI shows every ROOT_OUT ----------
+    try:
+        ui_server.run(
+            {
+                name: {
+                    "root": r.root_out,
+                    "virtual": r.mode == "virtual",
+                    "request_recluster": r.scheduler.request_full,
+                }
+                for name, r in roots.items()
+            },
+            port=5000,
+        )
+    finally:
+        print("[SEFS] Shutting down — draining ingest pipelines")
+        for r in roots.values():
+            r.stop()
+        remote_workers.shutdown()
+        cluster_worker.shutdown()
 
 
 if __name__ == "__main__":
     main()
-
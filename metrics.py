@@ -0,0 +1,249 @@
+"""
+metrics.py
+==========
+Low-overhead in-process metrics for the ingest pipeline.
+Counters, histograms and gauges are kept in memory and rendered in
+Prometheus text format by ui_server on /api/metrics.
+
+Usage:
+    with metrics.timed("extract"):
+        text = extract_text(path)
+
+    metrics.gauge("sefs_files_tracked", "Files held in FILES").set_function(lambda: len(FILES))
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+_registry = {}               # name -> metric (insertion ordered)
+_registry_lock = threading.Lock()
+
+
+# =============================
+# Helpers
+# =============================
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# =============================
+# Metric types
+# =============================
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        return []
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn):
+        """Evaluate fn() lazily at scrape time instead of storing a value.
+        For labelled gauges fn returns {label value(s): value}."""
+        self._function = fn
+        return self
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                return []
+            if not isinstance(value, dict):
+                return [f"{self.name} {_fmt_value(value)}"]
+            items = [(k if isinstance(k, tuple) else (k,), v) for k, v in value.items()]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}    # key -> [bucket counts..., count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                row[idx] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def snapshot(self, **labels):
+        """Raw [bucket counts..., count, sum] for one label set."""
+        with self._lock:
+            return list(self._values.get(self._key(labels), [0] * (len(self.buckets) + 2)))
+
+    def quantile(self, q, row=None, **labels):
+        """Estimate the q-quantile by linear interpolation inside the bucket
+        that holds it (as Prometheus' histogram_quantile does). `row` may be
+        a difference of two snapshots to look at one time window only."""
+        row = self.snapshot(**labels) if row is None else row
+        total = row[-2]
+        if not total:
+            return None
+        rank = q * total
+        cumulative, lower = 0, 0.0
+        for bound, n in zip(self.buckets, row):
+            if n and cumulative + n >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / n
+            cumulative += n
+            lower = bound
+        return self.buckets[-1]   # in the +Inf bucket: best known lower bound
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for key, row in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', _fmt_value(bound)))} {cumulative}")
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', '+Inf'))} {row[-2]}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(row[-1])}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {row[-2]}")
+        return out
+
+
+# =============================
+# Registry
+# =============================
+def _get_or_create(cls, name, help_text, labelnames, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_text, labelnames, **kwargs)
+        return metric
+
+
+def counter(name, help_text, labelnames=()):
+    return _get_or_create(Counter, name, help_text, labelnames)
+
+
+def gauge(name, help_text, labelnames=()):
+    return _get_or_create(Gauge, name, help_text, labelnames)
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+
+def render():
+    """Prometheus text exposition of every registered metric."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return "\n".join(m.render() for m in metrics) + "\n"
+
+
+# =============================
+# Pipeline stages
+# =============================
+STAGE_SECONDS = histogram(
+    "sefs_stage_seconds", "Time spent in each ingest/recluster stage", ("stage",)
+)
+STAGE_TOTAL = counter(
+    "sefs_stage_total", "Stage executions by outcome", ("stage", "outcome")
+)
+EVENTS_TOTAL = counter(
+    "sefs_events_total", "Filesystem events consumed from the event queue", ("event",)
+)
+
+
+@contextmanager
+def timed(stage):
+    """Time a block as one execution of `stage`; exceptions count as errors.
+    The block is also recorded as a trace span when tracing is enabled."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with tracing.span(stage, cat="stage"):
+            yield
+        outcome = "ok"
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_TOTAL.inc(stage=stage, outcome=outcome)
@@ -0,0 +1,259 @@
+"""
+pipeline.py
+===========
+Staged worker pipeline with bounded queues.
+
+Each Stage owns a bounded queue and N worker threads. A handler takes a
+job and returns the job for the next stage, None to drop it, or PARKED
+when it handed the job to something that will put it back later (a
+background transfer, remote workers). Dropped jobs, including ones whose
+handler raised, go to the pipeline's on_drop(stage name, job). Puts
+block when the next queue is full, so a slow stage pushes back all the
+way to whoever calls Pipeline.submit() — in main.py that is the event
+dispatcher, and behind it the watcher.
+
+Usage:
+    pipe = Pipeline([
+        Stage("extract", extract, workers=4),
+        Stage("embed",   embed,   workers=1, batch_size=16),
+    ])
+    pipe.start()
+    pipe.submit(job)
+    pipe.shutdown(drain=True)
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from queue import Queue, Empty
+
+import metrics
+
+_STOP = object()
+PARKED = object()   # handler return: job was handed off and will re-enter later
+
+QUEUE_DEPTH = metrics.gauge(
+    "sefs_pipeline_queue_depth", "Jobs waiting in each pipeline stage queue", ("pipeline", "stage")
+)
+IN_FLIGHT = metrics.gauge(
+    "sefs_pipeline_in_flight", "Jobs currently being handled by each stage", ("pipeline", "stage")
+)
+
+_running = []   # started pipelines, for the gauges above
+_running_lock = threading.Lock()
+
+
+def _per_stage(value):
+    with _running_lock:
+        return {(p.name, s.name): value(s) for p in _running for s in p.stages}
+
+
+QUEUE_DEPTH.set_function(lambda: _per_stage(Stage.depth))
+IN_FLIGHT.set_function(lambda: _per_stage(Stage.busy))
+
+
+class CostQueue(Queue):
+    """Bounded queue ordered by virtual deadline = arrival + estimated cost.
+
+    Cheap jobs overtake expensive ones, but a job's deadline is fixed when
+    it arrives, so once it has waited its own cost (capped at max_delay)
+    it is served before anything newer — large files age in instead of
+    starving behind a stream of small ones.
+    """
+
+    def __init__(self, maxsize=0, cost=None, max_delay=30.0):
+        self.cost = cost
+        self.max_delay = max_delay
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self.queue = []
+        self._seq = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        if item is _STOP:
+            key = float("inf")   # drain everything real first
+        else:
+            key = time.monotonic() + min(max(self.cost(item), 0.0), self.max_delay)
+        heapq.heappush(self.queue, (key, next(self._seq), item))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[2]
+
+
+class Stage:
+    """One pipeline step: a bounded queue drained by `workers` threads.
+
+    With batch_size > 1 the handler receives a list of up to batch_size
+    jobs (whatever is already queued) and must return a list.
+    With cost=fn(job) -> seconds the queue is a CostQueue instead of FIFO.
+    """
+
+    def __init__(self, name, handler, workers=1, maxsize=64, batch_size=1,
+                 cost=None, max_delay=30.0):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.cost = cost
+        self.max_delay = max_delay
+        self.queue = self._make_queue(maxsize)
+        self.next = None
+        self.on_drop = None
+        self._threads = []
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+
+    def _make_queue(self, maxsize):
+        if self.cost is not None:
+            return CostQueue(maxsize, self.cost, self.max_delay)
+        return Queue(maxsize=maxsize)
+
+    # ---------- producer side ----------
+    def put(self, job):
+        self.queue.put(job)   # blocks when full → backpressure
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def busy(self):
+        return self._busy
+
+    # ---------- worker side ----------
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(
+                target=self._run, name=f"{self.name}-{i}", daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+
+    def _take_batch(self):
+        """Block for one job, then greedily take whatever else is queued."""
+        first = self.queue.get()
+        if first is _STOP or self.batch_size == 1:
+            return first, [first]
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                job = self.queue.get_nowait()
+            except Empty:
+                break
+            if job is _STOP:
+                # put it back for ourselves after this batch
+                self.queue.put(job)
+                self.queue.task_done()
+                break
+            batch.append(job)
+        return first, batch
+
+    def _run(self):
+        while True:
+            first, batch = self._take_batch()
+            if first is _STOP:
+                self.queue.task_done()
+                return
+
+            with self._busy_lock:
+                self._busy += 1
+            try:
+                results = self._handle(batch)
+                kept = [job for job in results if job is not None and job is not PARKED]
+                if self.on_drop is not None:
+                    handed_on = {id(job) for job in results if job is not None}
+                    if self.batch_size == 1 and results and results[0] is PARKED:
+                        handed_on.add(id(batch[0]))
+                    for job in batch:
+                        if id(job) not in handed_on:
+                            self._drop(job)
+                if self.next is not None:
+                    for job in kept:
+                        self.next.put(job)
+            finally:
+                with self._busy_lock:
+                    self._busy -= 1
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _drop(self, job):
+        try:
+            self.on_drop(self.name, job)
+        except Exception as e:
+            print(f"[Pipeline] {self.name} drop hook failed: {e}")
+
+    def _handle(self, batch):
+        try:
+            with metrics.timed(self.name):
+                if self.batch_size == 1:
+                    return [self.handler(batch[0])]
+                return self.handler(batch)
+        except Exception as e:
+            print(f"[Pipeline] {self.name} failed: {e}")
+            return []
+
+    def stop(self, timeout=None):
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+
+class Pipeline:
+    def __init__(self, stages, name="default", on_drop=None):
+        self.name = name
+        self.stages = list(stages)
+        for a, b in zip(self.stages, self.stages[1:]):
+            a.next = b
+        for stage in self.stages:
+            stage.on_drop = on_drop
+        self._by_name = {s.name: s for s in self.stages}
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        with _running_lock:
+            _running.append(self)
+        return self
+
+    def submit(self, job):
+        self.stages[0].put(job)
+
+    def join(self):
+        """Block until every submitted job has left the last stage."""
+        for stage in self.stages:
+            stage.queue.join()
+
+    def stage(self, name):
+        return self._by_name[name]
+
+    def stats(self):
+        return {
+            s.name: {"workers": s.workers, "queued": s.depth(), "busy": s.busy()}
+            for s in self.stages
+        }
+
+    def shutdown(self, drain=True, timeout=None):
+        """Stop all workers. With drain=True every job already accepted is
+        carried through to the last stage first; otherwise queued jobs are
+        discarded."""
+        for stage in self.stages:
+            if not drain:
+                _discard(stage.queue)
+            stage.stop(timeout)
+        with _running_lock:
+            if self in _running:
+                _running.remove(self)
+
+
+def _discard(q):
+    while True:
+        try:
+            q.get_nowait()
+            q.task_done()
+        except Empty:
+            return
@@ -0,0 +1,181 @@
+"""
+prototype_naming.py
+===================
+LLM-free cluster and domain naming with label prototypes.
+
+A label vocabulary (domains → topics → a few describing phrases, in the
+spirit of the old DOMAIN_KEYWORDS table) is embedded once with the same
+MODEL that embeds the files. Each topic prototype is the mean of its
+phrase embeddings; each domain prototype is the mean of all its topics.
+Naming a recluster is then one matrix product per level: every cluster
+centroid against every topic, every domain centroid against every domain.
+
+Centroids too far from every prototype (cosine < MIN_SIMILARITY) keep the
+class TF-IDF name they are given as fallback.
+
+The vocabulary can be replaced with a JSON file of the same shape via
+SEFS_LABELS=labels.json, or at runtime with set_labels().
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+LABELS = {
+    "Finance": {
+        "Invoices": ["invoice", "bill to", "amount due", "payment terms"],
+        "Taxes": ["tax return", "income tax", "deductions", "tax filing"],
+        "Banking": ["bank statement", "account balance", "transactions", "credit card"],
+        "Budgets": ["budget", "expenses", "cost forecast", "spending plan"],
+    },
+    "Study Material": {
+        "Machine Learning": ["machine learning", "training data", "classification model", "regression"],
+        "Deep Learning": ["neural network", "deep learning", "backpropagation", "transformer model"],
+        "Mathematics": ["theorem", "proof", "linear algebra", "calculus equations"],
+        "Physics": ["physics", "mechanics", "quantum", "thermodynamics"],
+        "Lecture Notes": ["lecture notes", "course syllabus", "exam preparation", "assignment"],
+    },
+    "Programming": {
+        "Source Code": ["function definition", "class", "import module", "source code"],
+        "Algorithms": ["algorithm", "data structures", "time complexity", "sorting"],
+        "Documentation": ["readme", "installation guide", "api reference", "usage"],
+        "Configuration": ["configuration file", "settings", "environment variables", "dependencies"],
+    },
+    "Legal": {
+        "Contracts": ["contract", "parties agree", "terms and conditions", "signature"],
+        "Policies": ["privacy policy", "compliance", "regulation", "terms of service"],
+        "Law": ["law", "court", "legal case", "statute"],
+    },
+    "Work": {
+        "Meeting Notes": ["meeting notes", "agenda", "action items", "minutes"],
+        "Reports": ["report", "summary of results", "quarterly review", "analysis"],
+        "Resumes": ["resume", "work experience", "skills", "education"],
+        "Project Plans": ["project plan", "milestones", "timeline", "deliverables"],
+    },
+    "Personal": {
+        "Travel": ["travel itinerary", "flight booking", "hotel reservation", "trip"],
+        "Health": ["medical report", "prescription", "health", "doctor appointment"],
+        "Recipes": ["recipe", "ingredients", "cooking", "bake"],
+        "Letters": ["dear", "letter", "sincerely", "regards"],
+    },
+}
+
+MIN_SIMILARITY = 0.25
+
+_lock = threading.Lock()
+_prototypes = None   # {"domains": [...], "D": matrix, "topics": [(domain, topic)], "T": matrix}
+
+
+def _load_configured():
+    path = os.environ.get("SEFS_LABELS")
+    if not path:
+        return
+    try:
+        with open(path, encoding="utf-8") as f:
+            set_labels(json.load(f))
+        print(f"[Prototype] label vocabulary loaded from {path}")
+    except (OSError, ValueError) as e:
+        print(f"[Prototype] could not load {path}: {e} — using built-in labels")
+
+
+def set_labels(labels):
+    """Replace the vocabulary; prototypes are re-embedded on next use."""
+    global LABELS, _prototypes
+    with _lock:
+        LABELS = labels
+        _prototypes = None
+
+
+def _normalize(m):
+    return m / (np.linalg.norm(m, axis=-1, keepdims=True) + 1e-12)
+
+
+def _encode(phrases):
+    from content_processor import EMBEDDER   # the same model the files were embedded with
+    return _normalize(np.asarray(EMBEDDER.encode(phrases), dtype=np.float64))
+
+
+def prototypes():
+    """Embed the vocabulary once (one batched encode) and cache it."""
+    global _prototypes
+    with _lock:
+        if _prototypes is not None:
+            return _prototypes
+
+        phrases, owner, topics = [], [], []
+        for domain, domain_topics in LABELS.items():
+            for topic, words in domain_topics.items():
+                for phrase in [topic, *words]:
+                    phrases.append(phrase)
+                    owner.append(len(topics))
+                topics.append((domain, topic))
+
+        vectors = _encode(phrases)
+        owner = np.asarray(owner)
+        T = _normalize(np.stack([vectors[owner == i].mean(axis=0) for i in range(len(topics))]))
+
+        domains = list(LABELS)
+        topic_domain = np.array([domains.index(d) for d, _ in topics])
+        D = _normalize(np.stack([T[topic_domain == i].mean(axis=0) for i in range(len(domains))]))
+
+        _prototypes = {"domains": domains, "D": D, "topics": topics, "T": T,
+                       "topic_domain": topic_domain}
+        return _prototypes
+
+
+def nearest(centroids, matrix, allowed=None):
+    """Index and cosine similarity of the nearest prototype for each row.
+    allowed: optional (rows × prototypes) bool mask of eligible prototypes."""
+    sims = _normalize(np.asarray(centroids, dtype=np.float64)) @ matrix.T
+    if allowed is not None:
+        sims = np.where(allowed, sims, -np.inf)
+    best = sims.argmax(axis=1)
+    return best, sims[np.arange(len(best)), best]
+
+
+def name_hierarchy(cluster_sums, domains, cluster_fallback, domain_fallback):
+    """Name every domain and cluster of one recluster.
+
+    cluster_sums:    {cluster id: sum of member embeddings}
+    domains:         {domain label: [cluster ids]}
+    *_fallback:      TF-IDF names used where no prototype is close enough
+    Returns ({domain label: name}, {cluster id: name}). A cluster in a
+    domain that matched a prototype only considers that domain's topics,
+    so folders never mix vocabularies (no "Finance/Recipes").
+    """
+    protos = prototypes()
+
+    domain_ids = list(domains)
+    domain_sums = np.stack([
+        np.sum([cluster_sums[c] for c in domains[d]], axis=0) for d in domain_ids
+    ])
+    best, sim = nearest(domain_sums, protos["D"])
+    domain_names = {
+        d: protos["domains"][b] if s >= MIN_SIMILARITY else domain_fallback[d]
+        for d, b, s in zip(domain_ids, best, sim)
+    }
+
+    cluster_ids = list(cluster_sums)
+    cluster_domain = {c: domain_names[d] for d, cids in domains.items() for c in cids}
+
+    # a cluster under a matched domain only sees that domain's topics
+    allowed = np.ones((len(cluster_ids), len(protos["topics"])), dtype=bool)
+    for row, c in enumerate(cluster_ids):
+        if cluster_domain[c] in protos["domains"]:
+            allowed[row] = protos["topic_domain"] == protos["domains"].index(cluster_domain[c])
+    best, sim = nearest(np.stack([cluster_sums[c] for c in cluster_ids]), protos["T"], allowed)
+
+    cluster_names = {}
+    taken = set()   # (domain name, cluster name): two clusters must not share a folder
+    for c, b, s in sorted(zip(cluster_ids, best, sim), key=lambda x: -x[2]):
+        name = protos["topics"][b][1] if s >= MIN_SIMILARITY else cluster_fallback[c]
+        if (cluster_domain[c], name) in taken:
+            name = f"{name} {cluster_fallback[c]}"
+        taken.add((cluster_domain[c], name))
+        cluster_names[c] = name
+    return domain_names, cluster_names
+
+
+_load_configured()
@@ -0,0 +1,195 @@
+"""
+recluster.py
+============
+Adaptive recluster scheduler (replaces the fixed 8 s debounce Timer).
+
+- A single background thread runs reclusters, so two never overlap.
+- Changes are batched until the stream goes quiet for a short, cost-
+  scaled period, but never longer than max_wait after the first change.
+- Consecutive runs are at least min_interval apart.
+- Small change sets are assigned incrementally to the existing clusters;
+  large ones, drift after many incremental runs, or files that fit no
+  existing cluster trigger a full recluster.
+
+Usage:
+    sched = ReclusterScheduler(full_fn, incremental_fn, total_fn).start()
+    sched.notify(path)          # after every indexed file
+    sched.request_full()        # e.g. after the initial scan
+"""
+
+import threading
+import time
+
+import metrics
+
+_schedulers = []   # started schedulers, for the pending gauge
+
+metrics.gauge(
+    "sefs_recluster_pending", "Indexed changes waiting for the next recluster", ("root",)
+).set_function(lambda: {s.name: len(s._pending) for s in list(_schedulers)})
+
+
+class ReclusterScheduler:
+    def __init__(self, full_fn, incremental_fn, total_fn,
+                 min_interval=2.0, max_wait=30.0,
+                 min_quiet=0.5, incremental_ratio=0.1, max_incremental_runs=20,
+                 on_done=None, name="default"):
+        """
+        full_fn()               → full recluster, returns paths that changed
+                                  while it ran (queued for the next run)
+        incremental_fn(paths)   → assign paths to existing clusters, return
+                                  the paths it could not place (or None if
+                                  there is no previous fit to assign to)
+        total_fn()              → current corpus size
+        on_done(mode)           → called after each run (e.g. UI broadcast)
+        name                    → root label for metrics and log lines
+        """
+        self.name = name
+        self.full_fn = full_fn
+        self.incremental_fn = incremental_fn
+        self.total_fn = total_fn
+        self.on_done = on_done
+
+        self.min_interval = min_interval
+        self.max_wait = max_wait
+        self.min_quiet = min_quiet
+        self.incremental_ratio = incremental_ratio
+        self.max_incremental_runs = max_incremental_runs
+
+        self._cv = threading.Condition()
+        self._pending = set()
+        self._first_change = None
+        self._last_change = None
+        self._force_full = False
+        self._stopped = False
+
+        self._last_run_end = 0.0
+        self._incremental_runs = 0
+        self._cost = {"full": None, "incremental": None}   # EWMA seconds
+        self.running = False
+        self._thread = None
+
+    # ---------- producer side ----------
+    def notify(self, path=None):
+        with self._cv:
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            if path is not None:
+                self._pending.add(str(path))
+            self._cv.notify()
+
+    def request_full(self):
+        """Run a full recluster as soon as min_interval allows."""
+        with self._cv:
+            self._force_full = True
+            now = time.monotonic()
+            self._first_change = self._first_change or now
+            self._last_change = self._last_change or now
+            self._cv.notify()
+
+    def start(self):
+        _schedulers.append(self)
+        self._thread = threading.Thread(target=self._loop, name=f"recluster-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait=False):
+        """Stop scheduling; with wait=True also let a running recluster finish."""
+        with self._cv:
+            self._stopped = True
+            self._cv.notify()
+        if self in _schedulers:
+            _schedulers.remove(self)
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "running": self.running,
+            "cost": dict(self._cost),
+            "incremental_runs": self._incremental_runs,
+        }
+
+    # ---------- scheduling ----------
+    def _quiet_period(self):
+        # expensive reclusters wait for a longer lull so they batch more
+        full = self._cost["full"] or 0.0
+        return min(max(self.min_quiet, full * 0.5), self.max_wait)
+
+    def _due(self):
+        quiet_due = self._last_change + (0.0 if self._force_full else self._quiet_period())
+        deadline = self._first_change + self.max_wait
+        return max(self._last_run_end + self.min_interval, min(quiet_due, deadline))
+
+    def _choose_mode(self, pending):
+        if self._force_full or self._cost["full"] is None:
+            return "full"
+        if self._incremental_runs >= self.max_incremental_runs:
+            return "full"
+        total = max(self.total_fn(), 1)
+        if len(pending) > self.incremental_ratio * total:
+            return "full"
+        # when a full run is cheaper than a handful of incremental ones, just do it
+        inc = self._cost["incremental"]
+        if inc is not None and self._cost["full"] <= inc:
+            return "full"
+        return "incremental"
+
+    def _loop(self):
+        while True:
+            with self._cv:
+                while not self._stopped and self._first_change is None:
+                    self._cv.wait()
+                if self._stopped:
+                    return
+                wait = self._due() - time.monotonic()
+                if wait > 0:
+                    self._cv.wait(wait)
+                    continue   # re-evaluate: more changes may have arrived
+
+                pending = self._pending
+                mode = self._choose_mode(pending)
+                self._pending = set()
+                self._first_change = self._last_change = None
+                self._force_full = False
+                self.running = True
+
+            try:
+                self._run(mode, pending)
+            except Exception as e:
+                print(f"[Recluster] {self.name}: {mode} run failed: {e}")
+            finally:
+                with self._cv:
+                    self.running = False
+                    self._last_run_end = time.monotonic()
+
+    def _run(self, mode, pending):
+        if mode == "incremental":
+            start = time.monotonic()
+            with metrics.timed("recluster_incremental"):
+                leftover = self.incremental_fn(sorted(pending))
+            self._record("incremental", time.monotonic() - start)
+            if leftover is None or leftover:
+                print(f"[Recluster] {self.name}: {len(leftover or pending)} file(s) fit no cluster — full recluster")
+                mode = "full"
+            else:
+                self._incremental_runs += 1
+
+        if mode == "full":
+            start = time.monotonic()
+            with metrics.timed("recluster"):
+                conflicts = self.full_fn()
+            self._record("full", time.monotonic() - start)
+            self._incremental_runs = 0
+            for path in conflicts or ():
+                self.notify(path)
+
+        if self.on_done:
+            self.on_done(mode)
+
+    def _record(self, mode, seconds, alpha=0.3):
+        prev = self._cost[mode]
+        self._cost[mode] = seconds if prev is None else (1 - alpha) * prev + alpha * seconds
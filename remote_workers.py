@@ -0,0 +1,608 @@
+"""
+remote_workers.py
+=================
+Fan extraction + embedding out to worker processes on other machines.
+
+The main process keeps owning FILES, clustering and moves. Jobs that
+reach the "remote" pipeline stage are parked in the Coordinator. Workers
+pull them over plain HTTP, extract the text, hash the content and encode
+a whole batch, then post the results back. Finished jobs re-enter the
+pipeline at the index stage.
+
+Protocol (JSON over HTTP, optional X-SEFS-Token header):
+    POST /lease     {"worker", "max", "wait"} → {"jobs": [{"id", "name", "path", "size"}],
+                                                 "lease_seconds"}
+                    long-polls up to `wait` seconds when nothing is queued
+    GET  /content/<id>                     → the file's bytes
+    POST /heartbeat {"worker", "ids"}      → extends the leases of jobs still being worked on
+    POST /complete  {"worker", "results": [{"id", "hash", "text", "embedding"} |
+                                           {"id", "skip": true} | {"id", "error"}]}
+    GET  /status                           → queue, leases and worker table
+
+Embeddings travel as base64 float32. A lease that expires (worker died or
+stalled) puts the job back in the queue; after MAX_ATTEMPTS, or when no
+worker has asked for work for LOCAL_AFTER seconds, the job falls back to
+the local extract → hash → embed stages. A late result for a job that was
+already re-leased and finished is ignored.
+
+Workers:
+    python remote_workers.py worker --url http://host:5001 [--batch 8] [--shared-fs]
+    coordinator.spawn_local(2)       # same thing as local subprocesses (testing)
+"""
+
+import argparse
+import base64
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import metrics
+
+LEASE_SECONDS = 120.0
+MAX_ATTEMPTS = 3
+LOCAL_AFTER = 30.0      # no worker polled for this long → process queued jobs locally
+MAX_DELAY = 30.0        # aging bound for the cost-ordered queue (as in pipeline.CostQueue)
+WORKER_TIMEOUT = 60.0   # a worker not heard from for this long is considered gone
+
+JOBS_TOTAL = metrics.counter(
+    "sefs_remote_jobs_total", "Remote ingest jobs by outcome", ("result",)
+)
+
+
+class _Task:
+    def __init__(self, task_id, job, on_done, on_fail, owner, on_drop=None):
+        self.id = task_id
+        self.job = job
+        self.owner = owner
+        self.on_done = on_done
+        self.on_fail = on_fail
+        self.on_drop = on_drop or (lambda job: None)
+        self.attempts = 0
+        self.worker = None
+        self.deadline = None      # lease expiry (monotonic) while leased
+        self.settled = False      # result accepted, being handed back
+        self.queued_at = time.monotonic()
+
+
+class Coordinator:
+    def __init__(self, host="127.0.0.1", port=5001, token=None,
+                 lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, local_after=LOCAL_AFTER):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.local_after = local_after
+
+        self._cv = threading.Condition()
+        self._queue = []          # heap of (key, seq, task id)
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._tasks = {}          # task id -> _Task (queued or leased)
+        self._workers = {}        # worker id -> {"seen", "leased", "done", "failed"}
+        self._last_poll = time.monotonic()
+        self._polling = 0         # lease calls currently long-polling
+        self._server = None
+        self._stopped = False
+        self._procs = []
+
+        metrics.gauge("sefs_remote_queued", "Jobs waiting for a remote worker").set_function(
+            lambda: len(self._queue)
+        )
+        metrics.gauge("sefs_remote_in_flight", "Jobs leased to remote workers").set_function(
+            lambda: len(self._tasks) - len(self._queue)
+        )
+        metrics.gauge("sefs_remote_workers", "Remote workers seen recently").set_function(
+            lambda: len(self._live_workers())
+        )
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    # ---------- pipeline side ----------
+    def submit(self, job, on_done, on_fail, owner=None, on_drop=None):
+        """Park a job for the workers. on_done(job) gets it back with hash,
+        text, terms and embedding filled in; on_fail(job) when it has to be
+        processed locally instead; on_drop(job) when it has no text to
+        index. `owner` (a root name) scopes wait_idle."""
+        with self._cv:
+            task = _Task(next(self._ids), job, on_done, on_fail, owner, on_drop)
+            self._tasks[task.id] = task
+            self._enqueue(task)
+            self._cv.notify_all()
+
+    def wait_idle(self, owner=None, timeout=None):
+        """Block until no job (of `owner`, if given) is queued or leased."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            while any(owner is None or t.owner == owner for t in self._tasks.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cv.wait(remaining if remaining is not None else 1.0)
+        return True
+
+    def stats(self):
+        with self._cv:
+            now = time.monotonic()
+            return {
+                "queued": len(self._queue),
+                "leased": len(self._tasks) - len(self._queue),
+                "workers": {
+                    w: {**info, "seen": round(now - info["seen"], 1)}
+                    for w, info in self._workers.items()
+                },
+            }
+
+    # ---------- queue ----------
+    def _enqueue(self, task):
+        key = time.monotonic() + min(max(task.job.get("cost", 0.0), 0.0), MAX_DELAY)
+        task.worker = task.deadline = None
+        task.queued_at = time.monotonic()
+        heapq.heappush(self._queue, (key, next(self._seq), task.id))
+
+    def _live_workers(self):
+        now = time.monotonic()
+        return [w for w, info in self._workers.items() if now - info["seen"] < WORKER_TIMEOUT]
+
+    def _seen(self, worker):
+        info = self._workers.setdefault(worker, {"seen": 0.0, "leased": 0, "done": 0, "failed": 0})
+        info["seen"] = time.monotonic()
+        return info
+
+    def _settle(self, task, callback):
+        """Run the hand-back callback, then forget the task — it stays
+        counted by wait_idle until the job is back in the pipeline."""
+        try:
+            callback(task.job)
+        finally:
+            with self._cv:
+                self._tasks.pop(task.id, None)
+                self._cv.notify_all()
+
+    def _fail(self, task, reason):
+        """Give up on remote processing of one task (lock held)."""
+        task.settled = True
+        task.deadline = None
+        print(f"[Remote] {task.job.get('path')} → local ({reason})")
+        JOBS_TOTAL.inc(result="local")
+        threading.Thread(target=self._settle, args=(task, task.on_fail), daemon=True).start()
+
+    # ---------- protocol handlers ----------
+    def lease(self, worker, max_jobs=8, wait=0.0):
+        deadline = time.monotonic() + min(max(wait, 0.0), 30.0)
+        with self._cv:
+            self._last_poll = time.monotonic()
+            info = self._seen(worker)
+            self._polling += 1
+            try:
+                while not self._queue and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cv.wait(remaining)
+            finally:
+                self._polling -= 1
+
+            out = []
+            while self._queue and len(out) < max_jobs:
+                _, _, task_id = heapq.heappop(self._queue)
+                task = self._tasks.get(task_id)
+                if task is None or task.worker is not None:
+                    continue
+                task.attempts += 1
+                task.worker = worker
+                task.deadline = time.monotonic() + self.lease_seconds
+                out.append(task)
+            info["leased"] += len(out)
+
+        return {
+            "jobs": [
+                {
+                    "id": t.id,
+                    "name": os.path.basename(t.job["path"]),
+                    "path": t.job["path"],
+                    "size": _size(t.job["path"]),
+                }
+                for t in out
+            ],
+            "lease_seconds": self.lease_seconds,
+        }
+
+    def release(self, worker, ids):
+        """Put leased jobs back without counting an attempt (the lease
+        reply never reached the worker)."""
+        with self._cv:
+            for task_id in ids:
+                task = self._tasks.get(task_id)
+                if task is not None and not task.settled and task.worker == worker:
+                    task.attempts -= 1
+                    self._enqueue(task)
+            self._cv.notify_all()
+
+    def content_path(self, task_id):
+        with self._cv:
+            task = self._tasks.get(task_id)
+            return task.job["path"] if task is not None else None
+
+    def heartbeat(self, worker, ids):
+        with self._cv:
+            self._seen(worker)
+            renewed = 0
+            for task_id in ids:
+                task = self._tasks.get(task_id)
+                if task is not None and task.worker == worker:
+                    task.deadline = time.monotonic() + self.lease_seconds
+                    renewed += 1
+            return {"renewed": renewed}
+
+    def complete(self, worker, results):
+        from tfidf_naming import doc_terms   # shared vocabulary lives here, not on workers
+
+        accepted, finished = 0, []
+        with self._cv:
+            info = self._seen(worker)
+            for res in results:
+                task = self._tasks.get(res.get("id"))
+                if task is None or task.settled or task.worker != worker:
+                    continue   # lease expired and the job went elsewhere
+                if res.get("error"):
+                    info["failed"] += 1
+                    print(f"[Remote] {worker} failed {task.job['path']}: {res['error']}")
+                    if task.attempts >= self.max_attempts:
+                        self._fail(task, "retries exhausted")
+                    else:
+                        JOBS_TOTAL.inc(result="retry")
+                        self._enqueue(task)
+                    continue
+                task.settled = True
+                task.deadline = None
+                info["done"] += 1
+                accepted += 1
+                finished.append((task, res))
+            self._cv.notify_all()
+
+        # hand results back outside the lock: index-stage puts may block
+        for task, res in finished:
+            job = task.job
+            if res.get("skip"):
+                JOBS_TOTAL.inc(result="skipped")   # no text, as extract_job would drop it
+                self._settle(task, task.on_drop)
+                continue
+            try:
+                job["hash"] = res["hash"]
+                job["text"] = res["text"]
+                job["terms"] = doc_terms(res["text"])
+                job["embedding"] = np.frombuffer(
+                    base64.b64decode(res["embedding"]), dtype=np.float32
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"[Remote] malformed result for {job['path']}: {e!r}")
+                JOBS_TOTAL.inc(result="local")
+                self._settle(task, task.on_fail)
+                continue
+            JOBS_TOTAL.inc(result="done")
+            self._settle(task, task.on_done)
+        return {"accepted": accepted}
+
+    # ---------- lease reaper ----------
+    def _reap(self):
+        while not self._stopped:
+            time.sleep(1.0)
+            now = time.monotonic()
+            with self._cv:
+                for task in list(self._tasks.values()):
+                    if not task.settled and task.deadline is not None and now > task.deadline:
+                        print(f"[Remote] lease expired on {task.job['path']} ({task.worker})")
+                        if task.attempts >= self.max_attempts:
+                            self._fail(task, "retries exhausted")
+                        else:
+                            JOBS_TOTAL.inc(result="retry")
+                            self._enqueue(task)
+                            self._cv.notify_all()
+
+                # nobody is pulling: don't let the queue sit forever
+                if self._queue and not self._polling and now - self._last_poll > self.local_after:
+                    while self._queue:
+                        _, _, task_id = heapq.heappop(self._queue)
+                        task = self._tasks.get(task_id)
+                        if task is not None and task.worker is None:
+                            self._fail(task, "no remote workers")
+
+    # ---------- lifecycle ----------
+    def start(self):
+        coordinator = self
+
+        class Handler(_Handler):
+            pass
+        Handler.coordinator = coordinator
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]   # port=0 → pick a free one
+        threading.Thread(target=self._server.serve_forever, name="remote-http", daemon=True).start()
+        threading.Thread(target=self._reap, name="remote-reaper", daemon=True).start()
+        print(f"[Remote] coordinator listening on {self.url}")
+        return self
+
+    def spawn_local(self, n, batch=8):
+        """Start n workers as local subprocesses (testing / single big box)."""
+        env = dict(os.environ)
+        if self.token:
+            env["SEFS_WORKER_TOKEN"] = self.token
+        for i in range(n):
+            self._procs.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "worker",
+                 "--url", self.url, "--batch", str(batch), "--id", f"local-{i}", "--shared-fs"],
+                env=env,
+            ))
+        return self._procs
+
+    def stop(self):
+        with self._cv:
+            self._stopped = True
+            self._cv.notify_all()
+        for proc in self._procs:
+            proc.terminate()
+        for proc in self._procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        self._procs = []
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+# =============================
+# Process-wide coordinator (shared by every root)
+# =============================
+_coordinator = None
+
+
+def start(host="127.0.0.1", port=5001, token=None, local_workers=0):
+    global _coordinator
+    if _coordinator is None:
+        _coordinator = Coordinator(host, port, token).start()
+        if local_workers:
+            _coordinator.spawn_local(local_workers)
+    return _coordinator
+
+
+def coordinator():
+    """The running Coordinator, or None when remote ingest is off."""
+    return _coordinator
+
+
+def shutdown():
+    global _coordinator
+    if _coordinator is not None:
+        _coordinator.stop()
+        _coordinator = None
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    coordinator = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass   # one line per poll would drown the console
+
+    def _authorized(self):
+        token = self.coordinator.token
+        if token and self.headers.get("X-SEFS-Token") != token:
+            self._reply(403, {"error": "bad token"})
+            return False
+        return True
+
+    def _reply(self, status, body=None, raw=None, content_type="application/json"):
+        data = raw if raw is not None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        c = self.coordinator
+        if self.path == "/status":
+            return self._reply(200, c.stats())
+        if self.path.startswith("/content/"):
+            try:
+                path = c.content_path(int(self.path.rsplit("/", 1)[1]))
+            except ValueError:
+                path = None
+            if path is None:
+                return self._reply(404, {"error": "unknown or finished job"})
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError as e:
+                return self._reply(410, {"error": str(e)})
+            return self._reply(200, raw=data, content_type="application/octet-stream")
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        c = self.coordinator
+        try:
+            body = self._body()
+            worker = str(body.get("worker") or self.client_address[0])
+            if self.path == "/lease":
+                lease = c.lease(worker, int(body.get("max", 8)), float(body.get("wait", 0)))
+                try:
+                    return self._reply(200, lease)
+                except OSError:
+                    # worker went away while long-polling
+                    c.release(worker, [job["id"] for job in lease["jobs"]])
+                    return
+            if self.path == "/heartbeat":
+                return self._reply(200, c.heartbeat(worker, body.get("ids", [])))
+            if self.path == "/complete":
+                return self._reply(200, c.complete(worker, body.get("results", [])))
+        except (ValueError, KeyError, TypeError) as e:
+            return self._reply(400, {"error": repr(e)})
+        self._reply(404, {"error": "not found"})
+
+
+# =============================
+# Worker process
+# =============================
+def run_worker(url, batch=8, worker_id=None, token=None, shared_fs=False):
+    """Pull batches from the coordinator until interrupted."""
+    import requests
+    from content_processor import EMBEDDER, extract_text, is_supported   # loads the model once per worker
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    session = requests.Session()
+    if token:
+        session.headers["X-SEFS-Token"] = token
+    current = set()               # ids being worked on, shared with the heartbeat thread
+    current_lock = threading.Lock()
+    stop = threading.Event()
+
+    def _post(route, body, timeout=60, via=session):
+        r = via.post(url + route, json={"worker": worker_id, **body}, timeout=timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def _heartbeats(interval):
+        beat = requests.Session()   # sessions are not shared across threads
+        beat.headers.update(session.headers)
+        while not stop.wait(interval):
+            with current_lock:
+                ids = list(current)
+            if not ids:
+                continue
+            try:
+                _post("/heartbeat", {"ids": ids}, via=beat)
+            except Exception as e:
+                # keep beating: a dead heartbeat thread lets every later lease expire
+                print(f"[Remote] {worker_id}: heartbeat failed ({e})")
+
+    def _read(job):
+        if shared_fs and os.path.exists(job["path"]):
+            with open(job["path"], "rb") as f:
+                return f.read()
+        r = session.get(f"{url}/content/{job['id']}", timeout=300)
+        r.raise_for_status()
+        return r.content
+
+    print(f"[Remote] worker {worker_id} pulling from {url}")
+    heartbeat = None
+    backoff = 1.0
+    try:
+        while True:
+            try:
+                lease = _post("/lease", {"max": batch, "wait": 20}, timeout=40)
+            except requests.RequestException as e:
+                print(f"[Remote] {worker_id}: coordinator unreachable ({e}); retrying")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+            if heartbeat is None:
+                heartbeat = threading.Thread(
+                    target=_heartbeats, args=(lease["lease_seconds"] / 3,), daemon=True
+                )
+                heartbeat.start()
+
+            jobs = lease["jobs"]
+            if not jobs:
+                continue
+            with current_lock:
+                current.update(j["id"] for j in jobs)
+
+            results, todo = [], []
+            for job in jobs:
+                if not is_supported(job["name"]):
+                    # never fetch or parse a format the coordinator should not have sent
+                    results.append({"id": job["id"], "skip": True})
+                    continue
+                try:
+                    data = _read(job)
+                    suffix = os.path.splitext(job["name"])[1]
+                    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                        tmp.write(data)
+                    try:
+                        text = extract_text(tmp.name)
+                    finally:
+                        os.unlink(tmp.name)
+                    if not text.strip():
+                        results.append({"id": job["id"], "skip": True})
+                    else:
+                        todo.append((job, hashlib.md5(data).hexdigest(), text))
+                except Exception as e:
+                    results.append({"id": job["id"], "error": repr(e)})
+
+            if todo:
+                try:
+                    vectors = EMBEDDER.encode([text for _, _, text in todo])
+                    for (job, digest, text), vec in zip(todo, vectors):
+                        results.append({
+                            "id": job["id"],
+                            "hash": digest,
+                            "text": text,
+                            "embedding": base64.b64encode(
+                                np.asarray(vec, dtype=np.float32).tobytes()
+                            ).decode(),
+                        })
+                except Exception as e:
+                    results += [{"id": job["id"], "error": repr(e)} for job, _, _ in todo]
+
+            try:
+                _post("/complete", {"results": results}, timeout=120)
+            except requests.RequestException as e:
+                print(f"[Remote] {worker_id}: could not deliver results ({e}); leases will expire")
+            with current_lock:
+                current.clear()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SEFS remote extraction/embedding worker.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    w = sub.add_parser("worker", help="pull and process jobs from a coordinator")
+    w.add_argument("--url", required=True, help="coordinator URL, e.g. http://host:5001")
+    w.add_argument("--batch", type=int, default=8, help="jobs per lease (one encode call)")
+    w.add_argument("--id", help="worker name shown in /status (default host-pid)")
+    w.add_argument("--shared-fs", action="store_true",
+                   help="read files by path when visible here instead of downloading them")
+    args = parser.parse_args()
+
+    run_worker(args.url.rstrip("/"), args.batch, args.id,
+               token=os.environ.get("SEFS_WORKER_TOKEN"), shared_fs=args.shared_fs)
+
+
+if __name__ == "__main__":
+    main()
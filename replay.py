@@ -0,0 +1,314 @@
+"""
+replay.py
+=========
+Record the exact watchdog event stream of a live session and replay it
+through the ingest pipeline later, to compare builds on real workloads.
+
+Recording (main.py):
+    SEFS_RECORD=session.jsonl python main.py
+    SEFS_RECORD_BLOBS=1 ...      # also keep file contents (faithful replay)
+
+Every (event, src, dst) put on a root's event_queue becomes one JSON line with
+its offset from the start of the session, paths relative to ROOT_IN and a
+fingerprint of the file as it was at that moment (size + hash of the first
+and last 64 KiB) — enough to tell partial writes apart. With blobs on, the
+contents are stored once per fingerprint next to the session file.
+
+Replay:
+    python replay.py session.jsonl [--speed 10] [--report out.json]
+
+The session is fed into a scratch ROOT_IN/ROOT_OUT: before each event its
+file effect is re-created (write at the recorded size, rename, delete),
+then the event goes straight into event_queue — no watcher, so the
+sequence is the same on every run. Without blobs, text formats get
+deterministic filler of the recorded size. PDF and DOCX events are
+skipped, because random bytes would fail extraction and leave out
+exactly the cost being measured. The report counts them under
+"skipped_events". --speed scales the recorded gaps
+(0 = as fast as backpressure allows). The report gives throughput, ingest
+latency quantiles, per-stage time and the final recluster time.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from queue import Queue
+
+import metrics
+
+FINGERPRINT_SAMPLE = 64 * 1024
+FORMAT_VERSION = 1
+TEXT_EXTS = {".txt", ".md", ".csv", ".json", ".py", ".log", ".html", ".xml",
+             ".java", ".cpp", ".c", ".js"}
+NEEDS_BLOB = {".pdf", ".docx"}   # parsed formats: filler can't stand in for them
+
+
+# =============================
+# Recording
+# =============================
+def fingerprint(path):
+    """"size:hash" of the file right now, or None if it is gone."""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            h = hashlib.blake2b(digest_size=8)
+            h.update(f.read(FINGERPRINT_SAMPLE))
+            if size > FINGERPRINT_SAMPLE:
+                f.seek(max(FINGERPRINT_SAMPLE, size - FINGERPRINT_SAMPLE))
+                h.update(f.read(FINGERPRINT_SAMPLE))
+        return f"{size}:{h.hexdigest()}"
+    except OSError:
+        return None
+
+
+class Recorder:
+    def __init__(self, path, root, blobs=False, **meta):
+        self.path = Path(path)
+        self.root = str(root)
+        self.blob_dir = self.path.with_suffix(".blobs") if blobs else None
+        if self.blob_dir:
+            self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+        self._out = open(self.path, "w", encoding="utf-8", buffering=1)
+        self._write({"version": FORMAT_VERSION, "root": self.root,
+                     "started": time.time(), "blobs": bool(blobs), **meta})
+        print(f"[Replay] recording events → {self.path}")
+
+    def _rel(self, path):
+        if path is None:
+            return None
+        rel = os.path.relpath(path, self.root)
+        return path if rel.startswith("..") else rel
+
+    def _write(self, obj):
+        self._out.write(json.dumps(obj) + "\n")
+
+    def record(self, event, src, dst=None):
+        # fingerprint the file the pipeline will read: dst for a rename
+        target = dst if event == "moved" else src
+        fp = fingerprint(target) if event != "deleted" else None
+        if fp and self.blob_dir:
+            self._store_blob(target, fp)
+        rec = {
+            "t": round(time.monotonic() - self._t0, 6),
+            "event": event,
+            "src": self._rel(src),
+            "dst": self._rel(dst),
+            "fp": fp,
+        }
+        with self._lock:
+            self._write(rec)
+
+    def _store_blob(self, path, fp):
+        blob = self.blob_dir / fp.replace(":", "_")
+        if blob.exists():
+            return
+        try:
+            shutil.copyfile(path, blob)
+        except OSError as e:
+            print(f"[Replay] blob copy failed for {path}: {e}")
+
+    def close(self):
+        with self._lock:
+            self._out.close()
+
+
+class RecordingQueue(Queue):
+    """event_queue drop-in that logs every event it accepts."""
+
+    def __init__(self, maxsize, recorder):
+        super().__init__(maxsize)
+        self.recorder = recorder
+
+    def put(self, item, block=True, timeout=None):
+        if item is not None:
+            self.recorder.record(*item)
+        super().put(item, block, timeout)
+
+
+# =============================
+# Replay
+# =============================
+def load(session):
+    with open(session, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    header = lines[0] if lines and "version" in lines[0] else {}
+    events = lines[1:] if header else lines
+    return header, events
+
+
+def _materialize(path, fp, blob_dir):
+    """Write the file as it was when the event was recorded. False when
+    that can't be done faithfully (a parsed format without its blob)."""
+    if fp is None:
+        return True
+    size = int(fp.split(":")[0])
+    blob = blob_dir / fp.replace(":", "_") if blob_dir else None
+    if blob is not None and blob.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(blob, path)
+        return True
+    if path.suffix.lower() in NEEDS_BLOB:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # no contents recorded: deterministic filler of the recorded size
+    rng = random.Random(fp)
+    if path.suffix.lower() in TEXT_EXTS:
+        words = [f"w{rng.randrange(5000)}" for _ in range(256)]
+        chunk = (" ".join(words) + "\n").encode()
+    else:
+        chunk = rng.randbytes(64 * 1024)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            f.write(chunk[:remaining])
+            remaining -= len(chunk)
+    return True
+
+
+def _apply(rec, root, blob_dir):
+    """Re-create the event's file effect under `root`; return the event
+    tuple with scratch paths, or None if the event has to be skipped."""
+    src = root / rec["src"] if rec["src"] else None
+    dst = root / rec["dst"] if rec["dst"] else None
+    event = rec["event"]
+
+    if event == "deleted":
+        if src and src.exists():
+            src.unlink()
+    elif event == "moved":
+        if src and src.exists():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, dst)
+        elif fingerprint(dst) != rec["fp"] and not _materialize(dst, rec["fp"], blob_dir):
+            return None
+    elif fingerprint(src) != rec["fp"]:
+        # the move modes may already have staged the previous version away
+        if not _materialize(src, rec["fp"], blob_dir):
+            return None
+
+    return (event, str(src) if src else None, str(dst) if dst else None)
+
+
+def replay(session, speed=1.0, root_in=None, root_out=None):
+    """Feed a recorded session through the real pipeline; returns a report."""
+    import main as sefs   # loads the embedding model
+    import cluster_worker
+
+    header, events = load(session)
+    blob_dir = Path(session).with_suffix(".blobs")
+    blob_dir = blob_dir if blob_dir.is_dir() else None
+
+    root = sefs.Root(
+        "replay",
+        Path(root_in or tempfile.mkdtemp(prefix="sefs-replay-in-")),
+        Path(root_out or tempfile.mkdtemp(prefix="sefs-replay-out-")),
+    )
+    sefs.roots[root.name] = root
+    root.root_in.mkdir(parents=True, exist_ok=True)
+    print(f"[Replay] {len(events)} events from {session} → {root.root_in} (speed {speed or 'max'})")
+
+    latency_before = sefs.INGEST_LATENCY.snapshot(root=root.name, outcome="indexed")
+    stages_before = {s: metrics.STAGE_SECONDS.snapshot(stage=s) for s in sefs.PIPELINE_WORKERS}
+
+    root.start(watch=False, scan=False)
+
+    start = time.monotonic()
+    lag = 0.0
+    skipped = {}
+    for rec in events:
+        if speed:
+            wait = start + rec["t"] / speed - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                lag = max(lag, -wait)
+        item = _apply(rec, root.root_in, blob_dir)
+        if item is None:
+            ext = Path(rec["dst"] or rec["src"]).suffix.lower()
+            skipped[ext] = skipped.get(ext, 0) + 1
+            continue
+        root.event_queue.put(item)
+    fed = time.monotonic()
+
+    root.stop()   # drains: every accepted event is indexed when this returns
+    ingested = time.monotonic()
+
+    root.scheduler.stop(wait=True)
+    t = time.monotonic()
+    sefs.reorganize_files(root.root_out, mode=root.mode)
+    recluster_seconds = time.monotonic() - t
+
+    cluster_worker.shutdown()
+
+    latency = [a - b for a, b in zip(sefs.INGEST_LATENCY.snapshot(root=root.name, outcome="indexed"), latency_before)]
+    indexed = latency[-2]
+    ingest_seconds = ingested - start
+
+    def q(p):
+        v = sefs.INGEST_LATENCY.quantile(p, row=latency)
+        return None if v is None else round(v, 4)
+
+    stage_mean = {}
+    for stage, before in stages_before.items():
+        row = [a - b for a, b in zip(metrics.STAGE_SECONDS.snapshot(stage=stage), before)]
+        if row[-2]:
+            stage_mean[stage] = round(row[-1] / row[-2], 4)
+
+    counts = {}
+    for rec in events:
+        counts[rec["event"]] = counts.get(rec["event"], 0) + 1
+
+    return {
+        "session": str(session),
+        "recorded_seconds": events[-1]["t"] if events else 0.0,
+        "speed": speed,
+        "events": len(events),
+        "event_types": counts,
+        # parsed formats recorded without SEFS_RECORD_BLOBS: not comparable, not fed
+        "skipped_events": skipped,
+        "files_indexed": indexed,
+        "feed_seconds": round(fed - start, 3),
+        "max_feed_lag_seconds": round(lag, 3),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "events_per_second": round(len(events) / ingest_seconds, 2) if ingest_seconds else None,
+        "files_per_second": round(indexed / ingest_seconds, 2) if ingest_seconds else None,
+        "latency_seconds": {
+            "mean": round(latency[-1] / indexed, 4) if indexed else None,
+            "p50": q(0.5), "p90": q(0.9), "p99": q(0.99),
+        },
+        "stage_mean_seconds": stage_mean,
+        "final_recluster_seconds": round(recluster_seconds, 3),
+        "root_in": str(root.root_in),
+        "root_out": str(root.root_out),
+        "recorded": header,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded SEFS event session.")
+    parser.add_argument("session", help="JSONL file written with SEFS_RECORD")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time scale for recorded gaps; 0 = as fast as possible")
+    parser.add_argument("--root-in", help="scratch input root (default: new temp dir)")
+    parser.add_argument("--root-out", help="scratch output root (default: new temp dir)")
+    parser.add_argument("--report", help="also write the report JSON here")
+    args = parser.parse_args()
+
+    report = replay(args.session, args.speed, args.root_in, args.root_out)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.report:
+        Path(args.report).write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -135,22 +135,90 @@
 #     return tree
 
 
+import os
+import hashlib
 import numpy as np
-import shutil
 import re
+import time
+import threading
 import requests
 from pathlib import Path
-from collections import defaultdict
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.feature_extraction.text import TfidfVectorizer
+from collections import defaultdict, deque
+from scipy.cluster.hierarchy import fcluster
+import metrics
+import tracing
+import transfer
+import tfidf_naming
+import prototype_naming
+import cluster_worker
+from file_store import FileStore
 
 # =============================
 # Global state
 # =============================
-FILES = {}  # path -> {hash, embedding, text, cluster}
+FILES = FileStore()  # path -> {hash, embedding, text, cluster} (first root's namespace)
+CLUSTER_THRESHOLD = 0.35
+DOMAIN_THRESHOLD = 0.6    # coarser cut of the same dendrogram → domains
+
+
+class Corpus:
+    """Semantic state of one output root: its own FILES namespace plus
+    what the last recluster left behind. Roots never see each other's
+    files, so each one clusters and names independently."""
+
+    def __init__(self, root_dir, name=None, files=None):
+        self.root_dir = str(root_dir)
+        self.name = name or Path(root_dir).name
+        self.files = FileStore() if files is None else files
+        self.cluster_count = 0   # clusters produced by the last reorganize_files
+
+        # cluster_id -> {"sum": embedding sum, "count": n, "domain": str, "name": str}
+        # kept from the last full recluster so new files can be assigned incrementally
+        self.centroids = {}
+
+        # dendrogram of the last full fit: {"paths", "embeddings", "Z", "version"}
+        self.last_fit = None
+
+
+_corpora = {}   # str(root_dir) -> Corpus
+_corpora_lock = threading.Lock()
+
+
+def corpus(root_dir, name=None):
+    """The Corpus for an output root (created on first use). The first
+    root reuses the module-level FILES, so single-root callers that import
+    FILES keep working."""
+    key = str(root_dir)
+    with _corpora_lock:
+        c = _corpora.get(key)
+        if c is None:
+            c = _corpora[key] = Corpus(root_dir, name, files=None if _corpora else FILES)
+        return c
+
+
+def corpora():
+    with _corpora_lock:
+        return list(_corpora.values())
+
+
+metrics.gauge("sefs_files_tracked", "Files currently held in FILES", ("root",)).set_function(
+    lambda: {c.name: len(c.files) for c in corpora()}
+)
+metrics.gauge("sefs_clusters", "Clusters produced by the last recluster", ("root",)).set_function(
+    lambda: {c.name: c.cluster_count for c in corpora()}
+)
 
 OLLAMA_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODEL = "llama3.2:latest"
+OLLAMA_COOLDOWN = 300.0   # after a failure, skip Ollama for this many seconds
+
+# "llm"       → Ollama names clusters, class TF-IDF is the fallback
+# "tfidf"     → class TF-IDF only (fast, fully offline)
+# "prototype" → nearest label-vocabulary prototype (prototype_naming.py),
+#               TF-IDF for clusters that match no label; offline, milliseconds
+CLUSTER_NAMING = "llm"
+
+_ollama_down_until = 0.0
 
 # =============================
 # Helpers
@@ -163,26 +231,35 @@ def clean_name(name, max_len=40):
 
 
 def ollama_generate(prompt, max_chars=2000):
+    global _ollama_down_until
+
+    # don't pay a 60 s timeout per cluster while Ollama is known to be down
+    if time.monotonic() < _ollama_down_until:
+        return None
+
     try:
-        r = requests.post(
-            OLLAMA_URL,
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": prompt[:max_chars],
-                "stream": False
-            },
-            timeout=60
-        )
+        with metrics.timed("ollama"):
+            r = requests.post(
+                OLLAMA_URL,
+                json={
+                    "model": OLLAMA_MODEL,
+                    "prompt": prompt[:max_chars],
+                    "stream": False
+                },
+                timeout=60
+            )
         return r.json()["response"].strip()
     except Exception as e:
         print("[Ollama Error]", e)
+        _ollama_down_until = time.monotonic() + OLLAMA_COOLDOWN
         return None
 
 # =============================
 # LLM Naming — Cluster
 # =============================
-def name_cluster_llm(file_paths):
-    texts = [FILES[p]["text"] for p in file_paths if p in FILES]
+def name_cluster_llm(file_paths, files=None, fallback=None):
+    files = FILES if files is None else files
+    texts = [files[p]["text"] for p in file_paths if p in files]
     if not texts:
         return "Misc"
 
@@ -205,17 +282,20 @@ Documents:
     if out:
         return clean_name(out)
 
-    return name_cluster_tfidf(file_paths)
+    return fallback or name_cluster_tfidf(file_paths, files)
 
 # =============================
 # LLM Naming — Domain (Top Level)
 # =============================
-def name_domain_llm(file_paths):
-    texts = [FILES[p]["text"] for p in file_paths if p in FILES]
+def name_domain_llm(file_paths, files=None, fallback=None):
+    files = FILES if files is None else files
+    texts = [files[p]["text"] for p in file_paths if p in files]
     if not texts:
-        return "General"
+        return fallback or "General"
 
-    combined = "\n".join(texts)[:2000]
+    # equal share per document so every cluster's representative is seen
+    per_doc = max(200, 2000 // len(texts))
+    combined = "\n".join(t[:per_doc] for t in texts)[:2000]
 
     prompt = f"""
 Create a broad category name for these documents.
@@ -235,116 +315,517 @@ Documents:
     if out:
         return clean_name(out)
 
-    return "General"
+    return fallback or "General"
 
 # =============================
 # TF-IDF fallback
 # =============================
-def name_cluster_tfidf(file_paths):
-    texts = [FILES[p]["text"] for p in file_paths if p in FILES]
-    if not texts:
+def name_cluster_tfidf(file_paths, files=None):
+    """Single-cluster fallback; reorganize_files names all clusters at once
+    (and relative to each other) with tfidf_naming.name_clusters."""
+    files = FILES if files is None else files
+    if not any(p in files for p in file_paths):
         return "Misc"
-
-    tfidf = TfidfVectorizer(stop_words="english", max_features=5)
-    tfidf.fit(texts)
-    keywords = tfidf.get_feature_names_out()
-    return "_".join(keywords[:2]).title()
+    return tfidf_naming.name_clusters({0: file_paths}, files)[0]
 
 # =============================
-# Hierarchical clustering
+# Prototype naming (no LLM)
 # =============================
-def reorganize_files(root_dir):
-
-    file_paths = list(FILES.keys())
-
-    if len(file_paths) < 2:
-        print("[Semantic] Not enough files to cluster.")
-        return
-
-    embeddings = np.array([FILES[p]["embedding"] for p in file_paths])
-
-    clustering = AgglomerativeClustering(
-        n_clusters=None,
-        metric="cosine",
-        linkage="average",
-        distance_threshold=0.35
+def name_prototypes(cluster_sums, domains, keyword_names, domain_keywords):
+    """Domain and cluster names from the nearest label prototypes; falls
+    back to the TF-IDF names if the embedding model is unavailable."""
+    try:
+        domain_names, cluster_names = prototype_naming.name_hierarchy(
+            cluster_sums, domains, keyword_names, domain_keywords
+        )
+    except Exception as e:
+        print("[Prototype Error]", e)
+        return domain_keywords, keyword_names
+    return (
+        {d: clean_name(n) for d, n in domain_names.items()},
+        {c: clean_name(n) for c, n in cluster_names.items()},
     )
 
-    labels = clustering.fit_predict(embeddings)
-
-    clusters = defaultdict(list)
-    for path, label in zip(file_paths, labels):
-        FILES[path]["cluster"] = label
-        clusters[label].append(path)
+# =============================
+# Hierarchical clustering
+# =============================
+def fit_tree(embeddings):
+    """Average-linkage cosine dendrogram (scipy linkage matrix Z), fitted
+    in the cluster worker process so the UI stays responsive."""
+    return cluster_worker.fit(embeddings, method="average", metric="cosine")
+
+
+def cut_tree(Z, threshold):
+    """Flat labels (0-based) for a cut of the dendrogram at `threshold`."""
+    return fcluster(Z, t=threshold, criterion="distance") - 1
+
+
+def preview_threshold(threshold, domain_threshold=None, root_dir=None):
+    """Cluster counts and sizes for re-cutting the last fit at `threshold`.
+    Nothing is moved; commit with set_cluster_threshold + a recluster."""
+    if root_dir is None:
+        fits = corpora()
+        fit = fits[0].last_fit if fits else None
+    else:
+        fit = corpus(root_dir).last_fit
+    if fit is None:
+        return None
 
-    # ---------- LLM naming ----------
-    for cluster_id, paths in clusters.items():
+    labels = cut_tree(fit["Z"], threshold)
+    sizes = np.bincount(labels)
+    sizes = np.sort(sizes)[::-1]
+    domain_threshold = max(threshold, DOMAIN_THRESHOLD if domain_threshold is None else domain_threshold)
+    domains = int(cut_tree(fit["Z"], domain_threshold).max() + 1)
+
+    return {
+        "threshold": threshold,
+        "domain_threshold": domain_threshold,
+        "files": len(labels),
+        "clusters": int(len(sizes)),
+        "domains": domains,
+        "singletons": int((sizes == 1).sum()),
+        "largest": int(sizes[0]),
+        "sizes": sizes[:200].tolist(),
+    }
 
-        cluster_name = name_cluster_llm(paths)
-        domain_name = name_domain_llm(paths)
 
+def set_cluster_threshold(threshold, domain_threshold=None):
+    global CLUSTER_THRESHOLD, DOMAIN_THRESHOLD
+    CLUSTER_THRESHOLD = float(threshold)
+    if domain_threshold is not None:
+        DOMAIN_THRESHOLD = float(domain_threshold)
+
+
+def representatives(cluster_paths, embeddings, centroid, n=1):
+    """The n documents of a cluster closest to its centroid."""
+    c = centroid / (np.linalg.norm(centroid) + 1e-12)
+    norms = np.linalg.norm(embeddings, axis=1) + 1e-12
+    order = np.argsort(-(embeddings @ c) / norms)[:n]
+    return [cluster_paths[i] for i in order]
+
+
+def _move_entry(files, old_path, target_dir, since, label, **fields):
+    """Move one file on disk and re-key its FILES entry.
+
+    Returns (clean, path): `path` is where the entry lives now; `clean` is
+    False if the entry changed after version `since` (or vanished), so the
+    caller can hand it back to the next recluster.
+    """
+    src = Path(old_path)
+    dst = target_dir / src.name
+
+    if src == dst:
+        if files.changed_since(since, old_path):
+            return False, old_path
+        return files.update(old_path, **fields), old_path
+
+    if transfer.in_flight(old_path):
+        return True, old_path   # still being copied by an earlier run
+
+    result = {}
+
+    def _landed(t):
+        # the entry follows the file once it is in place (inline for a
+        # same-device rename, on a transfer worker for a cross-device copy)
+        if t.ok:
+            result["clean"] = files.rename(old_path, str(dst), since=since, **fields)
+
+    print(f"[Move] {src.name} → {label}")
+    with metrics.timed("cluster_move"):
+        t = transfer.move(src, dst, on_done=_landed)
+
+    if not t.is_same_device or not t.ok:
+        # copying in the background, or failed (retrying would fail the same way)
+        return True, old_path
+    return result["clean"], str(dst)
+
+
+def _tagged_name(src):
+    """Collision-free file name for src: stem_<path hash><suffix>."""
+    tag = hashlib.md5(str(src).encode()).hexdigest()[:6]
+    return f"{Path(src).stem}_{tag}{Path(src).suffix}"
+
+
+def _link(src, target_dir, mode):
+    """Materialize src inside target_dir as a symlink or hardlink."""
+    link = target_dir / Path(src).name
+    if link.is_symlink() or link.exists():
+        if link.is_symlink() and os.readlink(link) == str(src):
+            return link
+        link = target_dir / _tagged_name(src)
+        if link.is_symlink() or link.exists():
+            link.unlink()
+
+    if mode == "hardlink":
+        try:
+            os.link(src, link)
+            return link
+        except OSError as e:
+            print(f"[Link] hardlink failed ({e}) — using symlink")
+    os.symlink(src, link)
+    return link
+
+
+def _link_entry(files, path, root_dir, domain_name, cluster_name, since, mode, **fields):
+    """Organize without moving: record the placement on the FILES entry and,
+    in symlink/hardlink mode, (re)point a link under root_dir/domain/cluster.
+    Metadata-only in "virtual" mode."""
+    entry = files.get(path)
+    if entry is None or files.changed_since(since, path):
+        return False, path
+
+    placement = (domain_name, cluster_name)
+    link = entry.get("link")
+    if mode != "virtual" and (entry.get("placement") != placement or not link):
+        target_dir = Path(root_dir) / domain_name / cluster_name
+        target_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            with metrics.timed("cluster_link"):
+                if link and os.path.lexists(link):
+                    os.unlink(link)
+                link = str(_link(path, target_dir, mode))
+        except OSError as e:
+            print("[Link Error]", e)
+
+    return files.update(path, placement=placement, link=link, **fields), path
+
+
+def _place_entry(files, path, root_dir, domain_name, cluster_name, since, mode="move", **fields):
+    """Put one file into domain/cluster according to the organize mode:
+    "move" (physical move), "symlink"/"hardlink" (links in root_dir,
+    originals stay put) or "virtual" (placement recorded only)."""
+    if mode == "move":
         target_dir = Path(root_dir) / domain_name / cluster_name
         target_dir.mkdir(parents=True, exist_ok=True)
+        return _move_entry(files, path, target_dir, since, f"{domain_name}/{cluster_name}", **fields)
+    return _link_entry(files, path, root_dir, domain_name, cluster_name, since, mode, **fields)
 
-        for old_path in paths:
-            src = Path(old_path)
-            dst = target_dir / src.name
+def reorganize_files(root_dir, mode="move"):
+    """Full recluster of root_dir's corpus over a point-in-time snapshot.
 
-            if src != dst:
-                try:
-                    print(f"[Move] {src.name} → {domain_name}/{cluster_name}")
-                    shutil.move(str(src), str(dst))
+    Ingest keeps writing while this runs. Returns the paths whose entries
+    changed underneath the snapshot; they should go into the next run.
+    The dendrogram is kept in corpus.last_fit; if nothing changed since it was
+    built (e.g. only the threshold was changed) it is re-cut, not refit.
+    """
+    # term ids of files removed after the snapshot must not be reused mid-naming
+    with tfidf_naming.VOCAB.pinned():
+        return _reorganize(root_dir, mode)
 
-                    FILES[str(dst)] = FILES.pop(old_path)
-                    FILES[str(dst)]["cluster"] = cluster_id
 
-                except Exception as e:
-                    print("[Move Error]", e)
+def _reorganize(root_dir, mode):
+    state = corpus(root_dir)
+    files = state.files
+    snap = files.snapshot()
 
-    print("[Semantic] LLM hierarchical reorganization complete.")
+    fit = state.last_fit
+    if fit is not None and fit["version"] == snap.version:
+        file_paths, embeddings, Z = fit["paths"], fit["embeddings"], fit["Z"]
+    else:
+        file_paths = snap.keys()
 
-# =============================
-# Semantic tree builder
-# =============================
-def build_semantic_tree(root_dir):
+        if len(file_paths) < 2:
+            print("[Semantic] Not enough files to cluster.")
+            return []
 
-    tree = {
-        "name": Path(root_dir).name,
-        "type": "root",
-        "children": []
-    }
+        with tracing.span("matrix_build", cat="recluster", files=len(file_paths)):
+            embeddings = np.array([snap[p]["embedding"] for p in file_paths])
 
-    domain_map = defaultdict(list)
+        with metrics.timed("cluster_fit"):
+            Z = fit_tree(embeddings)
 
-    for path, meta in FILES.items():
-        p = Path(path)
-        parts = p.relative_to(root_dir).parts
+    labels = cut_tree(Z, CLUSTER_THRESHOLD)
+    # domains: the same dendrogram cut coarser, so every cluster nests in one
+    coarse = cut_tree(Z, max(DOMAIN_THRESHOLD, CLUSTER_THRESHOLD))
 
-        if len(parts) >= 3:
-            domain, cluster = parts[0], parts[1]
-        else:
-            domain, cluster = "Unsorted", "Files"
+    clusters = defaultdict(list)
+    for path, label in zip(file_paths, labels):
+        clusters[label].append(path)
+    state.cluster_count = len(clusters)
+    state.centroids.clear()
+    conflicts = []
+    final_paths = list(file_paths)
+    index_of = {p: i for i, p in enumerate(file_paths)}
+
+    # one vectorized pass names every cluster relative to the others
+    with metrics.timed("name_tfidf"):
+        keyword_names = tfidf_naming.name_clusters(clusters, snap)
+
+    cluster_ids = list(clusters)
+    sums = {c: embeddings[labels == c].sum(axis=0) for c in cluster_ids}
+
+    domains = defaultdict(list)   # domain label -> cluster ids
+    for c in cluster_ids:
+        domains[coarse[index_of[clusters[c][0]]]].append(c)
+
+    domain_keywords = tfidf_naming.name_clusters(
+        {d: [p for c in cids for p in clusters[c]] for d, cids in domains.items()},
+        snap, k=1
+    )
 
-        domain_map[(domain, cluster)].append(p.name)
+    if CLUSTER_NAMING == "prototype":
+        with metrics.timed("name_prototype"):
+            proto_domains, proto_clusters = name_prototypes(
+                {c: sums[c] for c in cluster_ids}, domains, keyword_names, domain_keywords
+            )
+
+    # ---------- domain naming: one call per domain ----------
+    domain_names = {}
+    for d, cids in domains.items():
+        with tracing.span("name_domain", cat="recluster", domain=int(d), clusters=len(cids)) as sp:
+            if CLUSTER_NAMING == "tfidf":
+                name = domain_keywords[d]
+            elif CLUSTER_NAMING == "prototype":
+                name = proto_domains[d]
+            else:
+                # the LLM sees one representative document per cluster
+                reps = []
+                for c in cids:
+                    member_idx = np.flatnonzero(labels == c)
+                    reps += representatives(
+                        clusters[c], embeddings[member_idx], sums[c] / len(member_idx)
+                    )
+                name = name_domain_llm(reps, snap, fallback=domain_keywords[d])
+            sp["name"] = name
+        for c in cids:
+            domain_names[c] = name
+
+    # ---------- cluster naming + moves ----------
+    for cluster_id, paths in clusters.items():
 
-    domains = defaultdict(dict)
-    for (domain, cluster), files in domain_map.items():
-        domains[domain][cluster] = files
+        with tracing.span("name_cluster", cat="recluster", cluster=int(cluster_id), files=len(paths)) as sp:
+            if CLUSTER_NAMING == "tfidf":
+                cluster_name = keyword_names[cluster_id]
+            elif CLUSTER_NAMING == "prototype":
+                cluster_name = proto_clusters[cluster_id]
+            else:
+                cluster_name = name_cluster_llm(paths, snap, fallback=keyword_names[cluster_id])
+            domain_name = domain_names[cluster_id]
+            sp["name"] = f"{domain_name}/{cluster_name}"
+
+        state.centroids[cluster_id] = {
+            "sum": sums[cluster_id],
+            "count": len(paths),
+            "domain": domain_name,
+            "name": cluster_name,
+        }
+
+        with tracing.span("moves", cat="recluster", cluster=int(cluster_id), mode=mode):
+            for old_path in paths:
+                clean, new_path = _place_entry(files, old_path, root_dir, domain_name, cluster_name,
+                                               snap.version, mode, cluster=cluster_id)
+                final_paths[index_of[old_path]] = new_path
+                if not clean:
+                    conflicts.append(new_path)   # the entry may already have moved
+
+    # keep the tree for threshold previews; it stays reusable only while
+    # FILES is untouched apart from our own moves
+    state.last_fit = {
+        "paths": final_paths,
+        "embeddings": embeddings,
+        "Z": Z,
+        "version": files.version if not conflicts else -1,
+    }
 
-    for domain, clusters in domains.items():
-        domain_node = {"name": domain, "type": "domain", "children": []}
+    if conflicts:
+        print(f"[Semantic] {len(conflicts)} file(s) changed during recluster — deferred")
+    print(f"[Semantic] Hierarchical reorganization complete ({CLUSTER_NAMING} naming).")
+    return conflicts
 
-        for cluster, files in clusters.items():
-            cluster_node = {"name": cluster, "type": "cluster", "children": []}
+# =============================
+# Incremental assignment
+# =============================
+def assign_incremental(root_dir, file_paths, mode="move"):
+    """Place new files into the nearest existing cluster without a refit.
+
+    Returns the paths that are farther than CLUSTER_THRESHOLD from every
+    centroid, changed while being placed, or are no longer in FILES under
+    that name (the caller should fall back to a full recluster), or None
+    when there is no previous fit to assign against.
+    """
+    state = corpus(root_dir)
+    files = state.files
+    if not state.centroids:
+        return None
 
-            for f in files:
-                cluster_node["children"].append({
-                    "name": f,
-                    "type": "file"
-                })
+    ids = list(state.centroids)
+    centroids = np.array([state.centroids[i]["sum"] / state.centroids[i]["count"] for i in ids])
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+
+    leftover = []
+    for old_path in file_paths:
+        since = files.stamp(old_path)
+        meta = files.get(old_path)
+        if meta is None or since is None:
+            leftover.append(old_path)   # removed or moved since it was notified
+            continue
+
+        vec = np.asarray(meta["embedding"], dtype=float)
+        sims = centroids @ (vec / (np.linalg.norm(vec) + 1e-12))
+        best = int(np.argmax(sims))
+        if 1.0 - sims[best] > CLUSTER_THRESHOLD:
+            leftover.append(old_path)
+            continue
+
+        cluster_id = ids[best]
+        info = state.centroids[cluster_id]
+        info["sum"] = info["sum"] + vec
+        info["count"] += 1
+
+        clean, new_path = _place_entry(files, old_path, root_dir, info["domain"], info["name"],
+                                       since, mode, cluster=cluster_id)
+        if not clean:
+            leftover.append(new_path)
+
+    return leftover
 
-            domain_node["children"].append(cluster_node)
+# =============================
+# Semantic tree (incremental)
+# =============================
+class SemanticTree:
+    """domain → cluster → file tree kept in step with FILES.
+
+    Subscribes to FILES writes and applies each add/remove/move in O(1),
+    so nothing walks FILES per frame. `version` increases on every
+    structural change (content-only updates don't count), and
+    changes_since(v) returns just the delta for consumers that keep
+    their own copy.
+    """
+
+    def __init__(self, root_dir, log_size=10000):
+        self.root_dir = str(root_dir)
+        self._prefix = self.root_dir.rstrip("/\\")
+        self.domains = {}        # domain -> cluster -> {file name (unique): path}
+        self._where = {}         # path -> (domain, cluster, name)
+        self._log = deque(maxlen=log_size)   # (version, op, domain, cluster, name)
+        self._lock = threading.RLock()
+        self._cached = None      # (version, dict)
+        self.version = 0
+
+        # hold our lock so writes racing the bootstrap queue up behind it
+        with self._lock:
+            for path, entry in corpus(root_dir).files.subscribe(self._on_change):
+                self._add(path, entry)
+
+    def placement(self, path, entry=None):
+        """(domain, cluster, name) for a file: the entry's recorded placement
+        (link/virtual organize modes), else its location under root_dir."""
+        if entry and entry.get("placement"):
+            domain, cluster = entry["placement"]
+            # a link's on-disk name is already unique within its folder
+            return domain, cluster, os.path.basename(entry.get("link") or path)
+        rel = path[len(self._prefix):]
+        if not path.startswith(self._prefix) or (rel and rel[0] not in "/\\"):
+            return None   # outside root_dir (e.g. a sibling "root2_old")
+        parts = [p for p in re.split(r"[\\/]", rel) if p]
+        if not parts:
+            return None
+        if len(parts) >= 3:
+            return parts[0], parts[1], parts[-1]
+        return "Unsorted", "Files", parts[-1]
+
+    # ---------- FILES listener ----------
+    def _on_change(self, op, path, new_path, entry):
+        with self._lock:
+            if op in ("put", "update"):
+                self._add(path, entry)
+            elif op == "remove":
+                self._remove(path)
+            elif op == "rename":
+                self._remove(path)
+                self._add(new_path, entry)
+
+    def _add(self, path, entry=None):
+        where = self.placement(path, entry)
+        prev = self._where.get(path)
+        if prev == where or (
+            prev and where and prev[:2] == where[:2] and prev[2] == _tagged_name(path)
+        ):
+            return
+        if prev is not None:
+            self._remove(path)   # placement changed (virtual/link modes)
+        if where is None:
+            return
+        domain, cluster, name = where
+        files = self.domains.setdefault(domain, {}).setdefault(cluster, {})
+        if files.get(name, path) != path:
+            # same-named file from another ROOT_IN folder in this cluster
+            name = _tagged_name(path)
+            where = (domain, cluster, name)
+        files[name] = path
+        self._where[path] = where
+        self._record("add", where)
+
+    def _remove(self, path):
+        where = self._where.pop(path, None)
+        if where is None:
+            return
+        domain, cluster, name = where
+        clusters = self.domains.get(domain, {})
+        files = clusters.get(cluster, {})
+        if files.get(name) == path:
+            del files[name]
+            if not files:
+                del clusters[cluster]
+            if not clusters:
+                self.domains.pop(domain, None)
+        self._record("remove", where)
+
+    def _record(self, op, where):
+        self.version += 1
+        self._log.append((self.version, op) + where)
+
+    # ---------- consumers ----------
+    def changes_since(self, version):
+        """[(version, "add"|"remove", domain, cluster, name), ...] after
+        `version`, or None if the log no longer reaches back that far."""
+        with self._lock:
+            if version >= self.version:
+                return []
+            if not self._log or self._log[0][0] > version + 1:
+                return None
+            return [rec for rec in self._log if rec[0] > version]
+
+    def to_dict(self):
+        """Nested dict in the shape the UIs expect; cached per version."""
+        with self._lock:
+            if self._cached and self._cached[0] == self.version:
+                return self._cached[1]
+
+            tree = {
+                "name": Path(self.root_dir).name,
+                "type": "root",
+                "children": []
+            }
+            for domain, clusters in self.domains.items():
+                domain_node = {"name": domain, "type": "domain", "children": []}
+                for cluster, files in clusters.items():
+                    domain_node["children"].append({
+                        "name": cluster,
+                        "type": "cluster",
+                        "children": [
+                            {"name": f, "type": "file", "path": p} for f, p in files.items()
+                        ]
+                    })
+                tree["children"].append(domain_node)
+
+            self._cached = (self.version, tree)
+            return tree
+
+
+_trees = {}
+_trees_lock = threading.Lock()
+
+
+def get_semantic_tree(root_dir):
+    """The incrementally maintained tree for root_dir (created on first use)."""
+    key = str(root_dir)
+    with _trees_lock:
+        tree = _trees.get(key)
+        if tree is None:
+            tree = _trees[key] = SemanticTree(root_dir)
+        return tree
 
-        tree["children"].append(domain_node)
 
-    return tree
+def build_semantic_tree(root_dir):
+    return get_semantic_tree(root_dir).to_dict()
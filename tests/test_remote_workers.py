@@ -0,0 +1,87 @@
+"""
+Remote ingest workers run as local subprocesses: a worker that dies
+holding a lease must not lose the job. A job the worker skips (no text)
+must reach the submitter's on_drop instead of vanishing.
+
+Run from the repo root:  python -m unittest discover tests
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import remote_workers
+
+
+class _Coordinator(remote_workers.Coordinator):
+    """Ignores results, so the job stays leased until the worker is killed."""
+
+    def complete(self, worker, results):
+        return {"accepted": 0}
+
+
+@unittest.skipIf(importlib.util.find_spec("sentence_transformers") is None,
+                 "workers need the embedding model")
+class LeaseRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.coordinator = _Coordinator(port=0, lease_seconds=1.0, local_after=3600).start()
+        fd, self.path = tempfile.mkstemp(suffix=".txt")
+        with os.fdopen(fd, "w") as f:
+            f.write("quarterly invoice for consulting services")
+
+    def tearDown(self):
+        self.coordinator.stop()
+        os.unlink(self.path)
+
+    def _task(self):
+        with self.coordinator._cv:
+            return next(iter(self.coordinator._tasks.values()), None)
+
+    def test_killed_worker_job_is_leased_again(self):
+        done, local = [], []
+        self.coordinator.submit({"path": self.path, "cost": 0.0}, done.append, local.append)
+
+        (proc,) = self.coordinator.spawn_local(1, batch=1)
+        deadline = time.monotonic() + 300   # the worker loads the model first
+        while self._task().worker is None:
+            self.assertIsNone(proc.poll(), "worker exited before leasing")
+            self.assertLess(time.monotonic(), deadline, "worker never leased the job")
+            time.sleep(0.1)
+        task_id = self._task().id
+        proc.kill()
+        proc.wait()
+
+        # the reaper puts the expired lease back; the next worker gets it
+        lease = self.coordinator.lease("replacement", max_jobs=1, wait=10)
+        self.assertEqual([job["id"] for job in lease["jobs"]], [task_id])
+        self.assertEqual(self._task().attempts, 2)
+        self.assertEqual((done, local), ([], []))
+
+
+class SkipTest(unittest.TestCase):
+    def setUp(self):
+        self.coordinator = remote_workers.Coordinator(port=0, local_after=3600).start()
+
+    def tearDown(self):
+        self.coordinator.stop()
+
+    def test_skipped_job_is_dropped(self):
+        done, local, dropped = [], [], []
+        job = {"path": "/nowhere/empty.txt", "cost": 0.0}
+        self.coordinator.submit(job, done.append, local.append, on_drop=dropped.append)
+
+        lease = self.coordinator.lease("w", max_jobs=1, wait=1)
+        (leased,) = lease["jobs"]
+        self.coordinator.complete("w", [{"id": leased["id"], "skip": True}])
+
+        self.assertTrue(self.coordinator.wait_idle(timeout=5))
+        self.assertEqual((done, local, dropped), ([], [], [job]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+"""
+tfidf_naming.py
+===============
+Offline cluster naming with class-based TF-IDF.
+
+One shared vocabulary is grown incrementally as files are ingested; each
+FILES entry carries its own sparse term counts ("terms"), computed once
+in the extract stage. The vocabulary counts how many documents use each
+term; when an entry is removed or replaced its terms are released, and
+ids nobody uses any more are recycled, so a long session doesn't grow it
+without bound. Naming a recluster then stacks those rows into a
+single clusters × vocabulary matrix and scores every cluster's terms
+against all the others in one vectorized pass:
+
+    score(t, c) = tf(t, c) * log(1 + A / f(t))
+
+tf is the term's share of the cluster's words, f(t) its total count over
+all clusters and A the average words per cluster — terms frequent in one
+cluster but rare elsewhere win.
+"""
+
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from sklearn.feature_extraction.text import CountVectorizer
+
+_analyze = CountVectorizer(stop_words="english").build_analyzer()
+
+
+class Vocabulary:
+    """Term ↔ id mapping shared by every document, with document counts.
+
+    ids() registers one document using `terms`; release() undoes it. An id
+    whose count drops to zero is reused for a new term — but not while a
+    naming pass is pinned() to a snapshot that may still hold it.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.terms = []
+        self.df = []           # id -> number of live documents using it
+        self._free = []        # ids ready for reuse
+        self._released = []    # ids freed while pinned
+        self._pins = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def ids(self, terms, track=True):
+        with self._lock:
+            out = []
+            for term in terms:
+                i = self.index.get(term)
+                if i is None:
+                    if self._free:
+                        i = self._free.pop()
+                        self.terms[i] = term
+                        self.df[i] = 0
+                    else:
+                        i = len(self.terms)
+                        self.terms.append(term)
+                        self.df.append(0)
+                    self.index[term] = i
+                if track:
+                    self.df[i] += 1
+                out.append(i)
+            return out
+
+    def release(self, ids):
+        with self._lock:
+            for i in map(int, ids):
+                self.df[i] -= 1
+                if self.df[i] <= 0:
+                    self.df[i] = 0
+                    if self.index.get(self.terms[i]) == i:
+                        del self.index[self.terms[i]]
+                        (self._released if self._pins else self._free).append(i)
+
+    @contextmanager
+    def pinned(self):
+        """Hold back id reuse while snapshot entries are being named."""
+        with self._lock:
+            self._pins += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins -= 1
+                if not self._pins:
+                    self._free += self._released
+                    self._released = []
+
+
+VOCAB = Vocabulary()
+
+
+def doc_terms(text, track=True):
+    """Sparse term counts of one document as (ids, counts) arrays.
+    With track=True the document holds its terms until release_terms()."""
+    counts = Counter(
+        t for t in _analyze(text)
+        if len(t) > 2 and not t.isdigit()
+    )
+    ids = VOCAB.ids(counts.keys(), track)
+    return (
+        np.asarray(ids, dtype=np.int64),
+        np.fromiter(counts.values(), dtype=np.float64, count=len(counts)),
+    )
+
+
+def release_terms(terms):
+    """The document holding `terms` (from doc_terms) is gone or replaced."""
+    if terms is not None:
+        VOCAB.release(terms[0])
+
+
+def _entry_terms(entry):
+    terms = entry.get("terms")
+    if terms is None:
+        terms = doc_terms(entry.get("text", ""), track=False)
+    return terms
+
+
+def top_terms(clusters, files, k=2):
+    """{label: [top k distinctive terms]} for every cluster at once.
+
+    clusters: {label: [paths]}, files: FILES or a snapshot of it.
+    """
+    labels = list(clusters)
+    rows, cols, vals = [], [], []
+    for r, label in enumerate(labels):
+        for path in clusters[label]:
+            if path not in files:
+                continue
+            ids, counts = _entry_terms(files[path])
+            rows.append(np.full(len(ids), r, dtype=np.int64))
+            cols.append(ids)
+            vals.append(counts)
+
+    if not vals:
+        return {label: [] for label in labels}
+
+    m = csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(len(labels), len(VOCAB)),
+    )
+    m.sum_duplicates()
+
+    words = np.asarray(m.sum(axis=1)).ravel()
+    freq = np.asarray(m.sum(axis=0)).ravel()
+    idf = np.log1p(words.mean() / np.maximum(freq, 1.0))
+    scores = (diags(1.0 / np.maximum(words, 1.0)) @ m @ diags(idf)).tocsr()
+    scores.eliminate_zeros()
+
+    # rank every (cluster, term) pair in one sort: by row, then score desc
+    row_of = np.repeat(np.arange(len(labels)), np.diff(scores.indptr))
+    order = np.lexsort((-scores.data, row_of))
+    rank = np.arange(len(order)) - scores.indptr[row_of[order]]
+    keep = order[rank < k]
+
+    out = {label: [] for label in labels}
+    for r, col in zip(row_of[keep], scores.indices[keep]):
+        out[labels[r]].append(VOCAB.terms[col])
+    return out
+
+
+def name_clusters(clusters, files, k=2):
+    """{label: folder name} in the same style as the old per-cluster namer."""
+    return {
+        label: "_".join(terms).title() or "Misc"
+        for label, terms in top_terms(clusters, files, k).items()
+    }
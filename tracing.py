@@ -0,0 +1,111 @@
+"""
+tracing.py
+==========
+Opt-in span recorder for individual slow events and reclusters.
+Spans are kept in a ring buffer and dumped in Chrome trace / Perfetto
+JSON format (load the file in chrome://tracing or ui.perfetto.dev).
+
+Enable with SEFS_TRACE=1 (or tracing.enable()). ui_server serves the
+last N minutes on /api/trace?minutes=N.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+MAX_SPANS = int(os.environ.get("SEFS_TRACE_BUFFER", "100000"))
+
+_enabled = os.environ.get("SEFS_TRACE", "") not in ("", "0", "false")
+_spans = deque(maxlen=MAX_SPANS)
+_thread_names = {}   # tid -> name
+_pid = os.getpid()
+
+
+def enable(max_spans=None):
+    global _enabled, _spans
+    if max_spans and max_spans != _spans.maxlen:
+        _spans = deque(_spans, maxlen=max_spans)
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def clear():
+    _spans.clear()
+
+
+def _record(name, cat, start_us, dur_us, args):
+    thread = threading.current_thread()
+    tid = thread.ident
+    if tid not in _thread_names:
+        _thread_names[tid] = thread.name
+    event = {
+        "name": name, "cat": cat, "ph": "X",
+        "ts": start_us, "dur": dur_us,
+        "pid": _pid, "tid": tid,
+    }
+    if args:
+        event["args"] = args
+    _spans.append(event)   # deque.append is atomic; old spans fall off
+
+
+@contextmanager
+def span(name, cat="sefs", **args):
+    """Record the enclosed block as one complete ("X") trace event."""
+    if not _enabled:
+        yield args
+        return
+    start_us = time.time() * 1e6
+    t0 = time.perf_counter()
+    try:
+        yield args   # callers may add result details to args
+    except Exception as e:
+        args["error"] = repr(e)
+        raise
+    finally:
+        _record(name, cat, start_us, (time.perf_counter() - t0) * 1e6, args)
+
+
+def complete(name, start, cat="sefs", **args):
+    """Record a span that began at wall-clock time `start` (time.time())
+    and ends now — for lifecycles that cross threads."""
+    if not _enabled:
+        return
+    now = time.time()
+    _record(name, cat, start * 1e6, (now - start) * 1e6, args)
+
+
+def instant(name, cat="sefs", **args):
+    if not _enabled:
+        return
+    thread = threading.current_thread()
+    _thread_names.setdefault(thread.ident, thread.name)
+    _spans.append({
+        "name": name, "cat": cat, "ph": "i", "s": "t",
+        "ts": time.time() * 1e6, "pid": _pid, "tid": thread.ident,
+        "args": args,
+    })
+
+
+def dump(minutes=None):
+    """Chrome trace JSON object with the spans of the last `minutes`."""
+    events = list(_spans)
+    if minutes is not None:
+        cutoff = (time.time() - minutes * 60) * 1e6
+        events = [e for e in events if e["ts"] + e.get("dur", 0) >= cutoff]
+
+    meta = [{"name": "process_name", "ph": "M", "pid": _pid, "args": {"name": "SEFS"}}]
+    meta += [
+        {"name": "thread_name", "ph": "M", "pid": _pid, "tid": tid, "args": {"name": tname}}
+        for tid, tname in list(_thread_names.items())
+    ]
+    return {"traceEvents": meta + events, "displayTimeUnit": "ms"}
@@ -0,0 +1,314 @@
+"""
+transfer.py
+===========
+Non-blocking file mover for staging (ROOT_IN → ROOT_OUT) and organize moves.
+
+- Same filesystem: a plain rename, done inline — it is a metadata update.
+- Across filesystems: the copy runs on a small worker pool using
+  kernel-side copy (os.copy_file_range, then os.sendfile, then a plain
+  buffered copy where neither exists) into a hidden temp file next to the
+  destination. The copy is verified (size, optionally a BLAKE2 digest),
+  fsynced and atomically renamed into place; only then is the source
+  removed, so a half-copied file never appears under its final name and a
+  failed transfer leaves the source untouched.
+
+Usage:
+    t = transfer.move(src, dst, on_done=lambda t: ...)
+    t.is_same_device / t.progress() / t.wait()
+    transfer.active()          # progress of running transfers (/api/transfers)
+    transfer.wait_idle()       # e.g. before shutdown
+"""
+
+import errno
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import metrics
+import tracing
+
+WORKERS = 2
+CHUNK = 8 * 1024 * 1024
+VERIFY = "size"            # "size" or "hash" (re-reads both files)
+HISTORY = 50               # finished transfers kept for /api/transfers
+
+TRANSFER_BYTES = metrics.counter(
+    "sefs_transfer_bytes_total", "Bytes copied across filesystems", ("method",)
+)
+TRANSFER_TOTAL = metrics.counter(
+    "sefs_transfers_total", "Finished file transfers", ("kind", "result")
+)
+
+_lock = threading.Lock()
+_idle = threading.Condition(_lock)
+_active = {}               # src -> Transfer (queued or copying)
+_history = []
+_pool = None
+
+
+class Transfer:
+    def __init__(self, src, dst, on_done=None):
+        self.src = Path(src)
+        self.dst = Path(dst)
+        self.on_done = on_done
+        self.size = 0
+        self.copied = 0
+        self.state = "queued"      # queued → copying → verifying → done | failed
+        self.method = None
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.is_same_device = False
+        self._event = threading.Event()
+
+    @property
+    def ok(self):
+        return self.state == "done"
+
+    def wait(self, timeout=None):
+        """Block until the transfer finished; True if it succeeded."""
+        self._event.wait(timeout)
+        return self.ok
+
+    def progress(self):
+        elapsed = (self.finished or time.time()) - self.started
+        return {
+            "src": str(self.src),
+            "dst": str(self.dst),
+            "state": self.state,
+            "method": self.method,
+            "size": self.size,
+            "copied": self.copied,
+            "percent": round(100.0 * self.copied / self.size, 1) if self.size else 100.0,
+            "rate_mb_s": round(self.copied / elapsed / 1e6, 2) if elapsed > 0 else None,
+            "error": self.error,
+        }
+
+
+# =============================
+# Public API
+# =============================
+def move(src, dst, on_done=None):
+    """Move src to dst. Same-device moves complete before this returns;
+    cross-device moves are queued on the worker pool. on_done(transfer)
+    runs once either way (on the worker thread for background copies)."""
+    t = Transfer(src, dst, on_done)
+    with _lock:
+        # check and claim in one step: duplicate events for one source can
+        # reach move() from two stage workers at once
+        running = _active.get(str(t.src))
+        if running is not None:
+            return running   # already on its way; don't copy twice
+        _active[str(t.src)] = t
+
+    try:
+        t.size = t.src.stat().st_size
+        t.is_same_device = _same_device(t.src, t.dst.parent)
+    except OSError as e:
+        _finish(t, e)
+        return t
+
+    if t.is_same_device:
+        try:
+            t.method = "rename"
+            os.replace(t.src, t.dst)
+            t.copied = t.size
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                _finish(t, e)
+                return t
+            t.is_same_device = False   # e.g. bind mounts: st_dev lied
+        else:
+            _finish(t)
+            return t
+
+    _executor().submit(_run, t)
+    return t
+
+
+def in_flight(src):
+    """True while a background transfer of src is queued or copying."""
+    with _lock:
+        return str(src) in _active
+
+
+def active():
+    with _lock:
+        return [t.progress() for t in _active.values()]
+
+
+def recent():
+    with _lock:
+        return [t.progress() for t in _history]
+
+
+def wait_idle(timeout=None):
+    """Block until no background transfer is left (callbacks included)."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _idle:
+        while _active:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            _idle.wait(remaining)
+    return True
+
+
+metrics.gauge(
+    "sefs_transfers_active", "Cross-device transfers queued or copying"
+).set_function(lambda: len(_active))
+
+
+# =============================
+# Worker side
+# =============================
+def _executor():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="transfer")
+        return _pool
+
+
+def _same_device(src, dst_dir):
+    return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+
+
+def _run(t):
+    tmp = t.dst.with_name(f".{t.dst.name}.sefs-part")
+    error = None
+    try:
+        with tracing.span("transfer", cat="io", src=str(t.src), size=t.size) as span_args:
+            t.state = "copying"
+            with open(t.src, "rb") as fsrc, open(tmp, "wb") as fdst:
+                # t.size was read at enqueue; a file still being written
+                # while it waited in the pool must not be copied short
+                before = os.fstat(fsrc.fileno())
+                if before.st_size != t.size:
+                    raise OSError(f"source changed while queued: {t.size} → {before.st_size} bytes")
+                _copy(t, fsrc, fdst)
+                fdst.flush()
+                os.fsync(fdst.fileno())
+
+            t.state = "verifying"
+            _verify(t, tmp, before)
+
+            # finalize: the file appears under its real name in one step
+            _copy_times(before, tmp)
+            os.replace(tmp, t.dst)
+            span_args["method"] = t.method
+            try:
+                os.unlink(t.src)
+            except OSError as e:
+                # the copy is complete at dst; only the original stayed behind
+                print(f"[Transfer] {t.src.name}: copied, but source not removed: {e}")
+    except Exception as e:
+        error = e
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+    _finish(t, error)
+
+
+def _copy(t, fsrc, fdst):
+    """Copy with the cheapest mechanism available, resuming from t.copied
+    if a kernel path turns out to be unsupported mid-way."""
+    fd_in, fd_out = fsrc.fileno(), fdst.fileno()
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            t.method = "copy_file_range"
+            _chunks(t, lambda n: os.copy_file_range(fd_in, fd_out, n, t.copied, t.copied))
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+    if hasattr(os, "sendfile"):
+        try:
+            t.method = "sendfile"
+            os.lseek(fd_out, t.copied, os.SEEK_SET)
+            _chunks(t, lambda n: os.sendfile(fd_out, fd_in, t.copied, n))
+            return
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+
+    t.method = "buffered"
+    fsrc.seek(t.copied)
+    fdst.seek(t.copied)
+    buf = memoryview(bytearray(CHUNK))
+
+    def _read_write(n):
+        got = fsrc.readinto(buf[:n])
+        if got:
+            fdst.write(buf[:got])
+        return got
+
+    _chunks(t, _read_write)
+
+
+def _chunks(t, step):
+    while t.copied < t.size:
+        n = step(min(CHUNK, t.size - t.copied))
+        if not n:
+            break   # source shrank; caught by _verify
+        t.copied += n
+        TRANSFER_BYTES.inc(n, method=t.method)
+
+
+def _verify(t, tmp, before):
+    after = os.stat(t.src)
+    if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+        raise OSError(f"source changed during transfer: {t.src}")
+    if os.path.getsize(tmp) != after.st_size:
+        raise OSError(f"size mismatch after copy: {os.path.getsize(tmp)}/{after.st_size} bytes")
+    if VERIFY == "hash" and _digest(t.src) != _digest(tmp):
+        raise OSError(f"checksum mismatch after copy: {t.src}")
+
+
+def _digest(path):
+    h = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    return h.digest()
+
+
+def _copy_times(st, path):
+    try:
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.chmod(path, st.st_mode & 0o7777)
+    except OSError:
+        pass
+
+
+def _finish(t, error=None):
+    t.state = "failed" if error else "done"
+    t.error = str(error) if error else None
+    t.finished = time.time()
+    kind = "rename" if t.is_same_device else "copy"
+    TRANSFER_TOTAL.inc(kind=kind, result=t.state)
+    if error:
+        print(f"[Transfer] {t.src.name} failed: {error}")
+    elif not t.is_same_device:
+        print(f"[Transfer] {t.src.name} → {t.dst} ({t.size} bytes, {t.method})")
+
+    if t.on_done:
+        try:
+            t.on_done(t)
+        except Exception as e:
+            print(f"[Transfer] on_done failed for {t.src.name}: {e}")
+
+    t._event.set()
+    with _idle:
+        if _active.get(str(t.src)) is t:
+            del _active[str(t.src)]
+        if not t.is_same_device:
+            _history.append(t)
+            del _history[:-HISTORY]
+        _idle.notify_all()
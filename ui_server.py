@@ -4,6 +4,10 @@ ui_server.py
 Flask + SSE UI server.
 Imported by main.py — does NOT run its own file watcher.
 main.py calls broadcast() after every fs event, and run() to start Flask.
+
+Several output roots can be served at once; every /api route takes an
+optional ?root=<name> (default: the first root), /api/roots lists them and
+SSE clients only receive broadcasts for the root they subscribed to.
 """
 
 import json
@@ -11,14 +15,27 @@ import time
 import queue
 import threading
 from pathlib import Path
-from flask import Flask, Response, send_from_directory
+from flask import Flask, Response, abort, request, send_file, send_from_directory
+
+import metrics
+import tracing
+import transfer
+import remote_workers
+import semantic_intelligence
 
 BASE_DIR  = Path(__file__).parent
 app       = Flask(__name__, static_folder=str(BASE_DIR / "static"))
 
-_clients: list[queue.Queue] = []
+_clients: list[tuple[str, queue.Queue]] = []   # (root name, queue)
 _lock    = threading.Lock()
-_root    = None   # set by run()
+
+# set by run(): name -> {"root": Path, "virtual": bool, "request_recluster": fn}
+# "virtual" → serve the semantic tree, not the filesystem;
+# "request_recluster" → schedules a full recluster of that root
+_roots   = {}
+_default = None
+
+metrics.gauge("sefs_sse_clients", "Connected SSE clients").set_function(lambda: len(_clients))
 
 
 # ── Tree builder (reads real filesystem) ─────────────────────────────────────
@@ -58,22 +75,77 @@ def build_tree(root: Path, depth=0, max_depth=6) -> dict:
     return node
 
 
-# ── Push to all SSE clients ───────────────────────────────────────────────────
+# ── Virtual tree (organize mode "virtual": nothing exists on disk) ─────────────
+def build_virtual_tree(root: Path) -> dict:
+    """Same node shape as build_tree, from the in-memory semantic tree.
+    File nodes point at the original file; /api/virtual/<id> serves it."""
+    sem = semantic_intelligence.get_semantic_tree(root).to_dict()
+
+    def convert(node, parent_id, depth):
+        node_id = f"{parent_id}/{node['name']}" if parent_id else "virtual"
+        out = {
+            "id":       node_id,
+            "name":     node["name"],
+            "type":     "root" if depth == 0 else "domain" if depth == 1
+                        else "folder" if node["type"] != "file" else "file",
+            "ext":      _file_ext(node["name"]) if node["type"] == "file" else None,
+            "path":     node.get("path", node_id),
+            "children": [convert(c, node_id, depth + 1) for c in node.get("children", [])],
+            "modified": None,
+        }
+        return out
+
+    return convert(sem, "", 0)
+
+
+def current_tree(name: str) -> dict:
+    cfg = _roots[name]
+    return build_virtual_tree(cfg["root"]) if cfg["virtual"] else build_tree(cfg["root"])
+
+
+def _selected():
+    """(name, config) of the root chosen with ?root=, else the default one."""
+    name = request.args.get("root") or _default
+    if name not in _roots:
+        abort(404)
+    return name, _roots[name]
+
+
+def _name_of(root_dir):
+    root = Path(root_dir)
+    for name, cfg in _roots.items():
+        if cfg["root"] == root:
+            return name
+    return None
+
+
+# ── Push to SSE clients ───────────────────────────────────────────────────────
 def broadcast(event_type: str, root_dir=None):
-    root = Path(root_dir) if root_dir else _root
-    if not root:
+    name = _name_of(root_dir) if root_dir else _default
+    if name is None:
         return
-    tree = build_tree(root)
-    data = json.dumps({"event": event_type, "tree": tree, "ts": time.time()})
+    with metrics.timed("broadcast"):
+        _broadcast_tree(event_type, name)
+
+
+def _broadcast_tree(event_type: str, name: str):
+    with _lock:
+        if not any(root == name for root, _ in _clients):
+            return   # nobody watching this root: skip building the tree
+    tree = current_tree(name)
+    data = json.dumps({"event": event_type, "root": name, "tree": tree, "ts": time.time()})
     with _lock:
         dead = []
-        for q in _clients:
+        for entry in _clients:
+            root, q = entry
+            if root != name:
+                continue
             try:
                 q.put_nowait(data)
             except queue.Full:
-                dead.append(q)
-        for q in dead:
-            _clients.remove(q)
+                dead.append(entry)
+        for entry in dead:
+            _clients.remove(entry)
 
 
 # ── Routes ────────────────────────────────────────────────────────────────────
@@ -82,24 +154,147 @@ def index():
     return send_from_directory(str(BASE_DIR / "static"), "index.html")
 
 
+@app.route("/api/roots")
+def get_roots():
+    return {
+        "default": _default,
+        "roots": [
+            {"name": name, "path": str(cfg["root"]), "virtual": cfg["virtual"]}
+            for name, cfg in _roots.items()
+        ],
+    }
+
+
 @app.route("/api/tree")
 def get_tree():
-    tree = build_tree(_root) if _root else {}
-    return {"tree": tree, "root": str(_root)}
+    if not _roots:
+        return {"tree": {}, "root": None}
+    name, cfg = _selected()
+    return {"tree": current_tree(name), "root": str(cfg["root"]), "name": name}
+
+
+@app.route("/api/virtual/<path:node_id>")
+def virtual_file(node_id):
+    """Serve a file by its virtual location: virtual/<domain>/<cluster>/<name>."""
+    _, cfg = _selected()
+    parts = node_id.split("/")
+    if len(parts) != 4 or parts[0] != "virtual":
+        abort(404)
+    _, domain, cluster, name = parts
+    tree = semantic_intelligence.get_semantic_tree(cfg["root"])
+    path = tree.domains.get(domain, {}).get(cluster, {}).get(name)
+    if not path:
+        abort(404)
+    return send_file(path)
+
+
+@app.route("/api/metrics")
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/transfers")
+def get_transfers():
+    """Progress of cross-device copies in flight, plus the last few finished."""
+    return {"active": transfer.active(), "recent": transfer.recent()}
+
+
+@app.route("/api/remote")
+def get_remote():
+    """Remote ingest workers: queued and leased jobs, per-worker counts."""
+    coordinator = remote_workers.coordinator()
+    if coordinator is None:
+        return {"error": "remote ingest disabled — start with SEFS_REMOTE=1"}, 404
+    return coordinator.stats()
+
+
+@app.route("/api/trace")
+def get_trace():
+    """Chrome trace JSON of the last ?minutes=N (default 5) of spans."""
+    if not tracing.is_enabled():
+        return {"error": "tracing disabled — start with SEFS_TRACE=1"}, 404
+    minutes = request.args.get("minutes", default=5.0, type=float)
+    resp = Response(json.dumps(tracing.dump(minutes)), mimetype="application/json")
+    resp.headers["Content-Disposition"] = "attachment; filename=sefs-trace.json"
+    return resp
+
+
+@app.route("/api/semantic")
+def semantic_changes():
+    """Semantic (domain/cluster/file) tree. With ?since=N only the changes
+    after version N are returned, unless they are no longer available."""
+    if not _roots:
+        return {}
+    _, cfg = _selected()
+    tree = semantic_intelligence.get_semantic_tree(cfg["root"])
+    since = request.args.get("since", type=int)
+    if since is not None:
+        changes = tree.changes_since(since)
+        if changes is not None:
+            return {"version": tree.version, "changes": changes}
+    return {"version": tree.version, "tree": tree.to_dict()}
+
+
+@app.route("/api/cluster/preview")
+def cluster_preview():
+    """Re-cut the last dendrogram at ?threshold=… without moving anything."""
+    threshold = request.args.get("threshold", type=float)
+    if threshold is None or not 0 < threshold < 2:
+        return {"error": "threshold must be a cosine distance in (0, 2)"}, 400
+    _, cfg = _selected()
+    preview = semantic_intelligence.preview_threshold(
+        threshold, request.args.get("domain_threshold", type=float), root_dir=cfg["root"]
+    )
+    if preview is None:
+        return {"error": "no clustering yet"}, 404
+    return preview
+
+
+def _is_distance(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and 0 < value < 2
+
+
+@app.route("/api/cluster/threshold", methods=["GET", "POST"])
+def cluster_threshold():
+    """GET current thresholds; POST {"threshold", "domain_threshold"?} to commit.
+    Thresholds are process-wide, so a commit reclusters every root."""
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        threshold = body.get("threshold")
+        domain_threshold = body.get("domain_threshold")
+        # validate everything before touching the globals
+        if not _is_distance(threshold):
+            return {"error": "threshold must be a cosine distance in (0, 2)"}, 400
+        if domain_threshold is not None:
+            if not _is_distance(domain_threshold):
+                return {"error": "domain_threshold must be a cosine distance in (0, 2)"}, 400
+            if domain_threshold < threshold:
+                return {"error": "domain_threshold must be >= threshold"}, 400
+        semantic_intelligence.set_cluster_threshold(threshold, domain_threshold)
+        for cfg in _roots.values():
+            if cfg.get("request_recluster"):
+                cfg["request_recluster"]()
+    return {
+        "threshold": semantic_intelligence.CLUSTER_THRESHOLD,
+        "domain_threshold": semantic_intelligence.DOMAIN_THRESHOLD,
+    }
 
 
 @app.route("/api/stream")
 def stream():
+    name = request.args.get("root") or _default
+    if name not in _roots:
+        abort(404)
     q: queue.Queue = queue.Queue(maxsize=100)
+    entry = (name, q)
     with _lock:
-        _clients.append(q)
+        _clients.append(entry)
 
     def generate():
         # Immediate snapshot on connect
-        if _root:
-            tree     = build_tree(_root)
-            snapshot = json.dumps({"event": "snapshot", "tree": tree, "ts": time.time()})
-            yield f"data: {snapshot}\n\n"
+        tree     = current_tree(name)
+        snapshot = json.dumps({"event": "snapshot", "root": name, "tree": tree, "ts": time.time()})
+        yield f"data: {snapshot}\n\n"
         while True:
             try:
                 data = q.get(timeout=25)
@@ -109,8 +304,8 @@ def stream():
 
     def cleanup(r):
         with _lock:
-            if q in _clients:
-                _clients.remove(q)
+            if entry in _clients:
+                _clients.remove(entry)
         return r
 
     resp = Response(
@@ -123,8 +318,18 @@ def stream():
 
 
 # ── Entry point called by main.py ────────────────────────────────────────────
-def run(root_dir, port=5000):
-    global _root
-    _root = Path(root_dir)
+def run(roots, port=5000, request_recluster=None, virtual=False):
+    """roots: {name: {"root", "virtual", "request_recluster"}}, or a single
+    root directory (with the keyword options) for the one-root setup."""
+    global _roots, _default
+    if not isinstance(roots, dict):
+        roots = {Path(roots).name: {
+            "root": roots, "virtual": virtual, "request_recluster": request_recluster,
+        }}
+    _roots = {
+        name: {**cfg, "root": Path(cfg["root"]), "virtual": cfg.get("virtual", False)}
+        for name, cfg in roots.items()
+    }
+    _default = next(iter(_roots))
     print(f"[SEFS UI] http://localhost:{port}")
     app.run(host="0.0.0.0", port=port, threaded=True, debug=False, use_reloader=False)
\ No newline at end of file
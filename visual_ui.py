@@ -2,28 +2,66 @@ from PySide6.QtWidgets import (
     QApplication, QGraphicsView, QGraphicsScene,
     QGraphicsEllipseItem, QGraphicsTextItem
 )
-from PySide6.QtCore import Qt, QTimer, QPointF, QPropertyAnimation
-from PySide6.QtGui import QColor
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QColor, QPainter
 import sys
-import math
 
-from semantic_intelligence import build_semantic_tree
-from pathlib import Path
+from semantic_intelligence import get_semantic_tree
 
 NODE_RADIUS = 18
 LEVEL_GAP = 120
 SIBLING_GAP = 80
 
+# level of detail: below these zoom factors labels / file nodes are hidden
+LABEL_MIN_SCALE = 0.45
+FILE_MIN_SCALE = 0.15
+
+COLORS = {
+    "root": QColor("#00FFD1"),
+    "domain": QColor("#FFD700"),
+    "cluster": QColor("#7EC8E3"),
+    "file": QColor("#FFFFFF")
+}
+
+
+def layout_tree(tree):
+    """Tidy, non-overlapping layout: every leaf gets its own x slot and each
+    parent is centred over its children. Returns {node_id: (x, y, node)}."""
+    positions = {}
+    next_slot = [0]
+
+    def place(node, node_id, depth):
+        children = node.get("children", [])
+        if children:
+            xs = [
+                place(child, f"{node_id}/{child['name']}", depth + 1)
+                for child in children
+            ]
+            x = (xs[0] + xs[-1]) / 2
+        else:
+            x = next_slot[0] * SIBLING_GAP
+            next_slot[0] += 1
+        positions[node_id] = (x, depth * LEVEL_GAP, node)
+        return x
+
+    place(tree, "", 0)
+    return positions
+
 
 class TreeUI(QGraphicsView):
     def __init__(self, root_dir):
         super().__init__()
         self.root_dir = root_dir
+        self.tree = get_semantic_tree(root_dir)
         self.scene = QGraphicsScene()
         self.setScene(self.scene)
 
-        self.nodes = {}
-        self.setRenderHint(self.renderHints() | self.renderHints())
+        self.nodes = {}       # node_id -> (circle, label, type)
+        self.version = None   # semantic tree version last drawn
+        self.setRenderHint(QPainter.Antialiasing)
+        self.setOptimizationFlag(QGraphicsView.DontSavePainterState)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
 
         self.setWindowTitle("SEFS – Semantic File System")
         self.resize(1200, 800)
@@ -33,40 +71,62 @@ class TreeUI(QGraphicsView):
         self.timer.start(1000)  # UI refresh every 1s (cheap)
 
     def update_tree(self):
-        tree = build_semantic_tree(self.root_dir)
-        self.scene.clear()
-        self.nodes.clear()
-        self.draw_node(tree, 0, 0, 0)
-
-    def draw_node(self, node, x, y, depth):
-        color = {
-            "root": QColor("#00FFD1"),
-            "domain": QColor("#FFD700"),
-            "cluster": QColor("#7EC8E3"),
-            "file": QColor("#FFFFFF")
-        }.get(node["type"], QColor("#AAAAAA"))
+        # nothing added, moved or removed since the last frame → no work
+        version = self.tree.version
+        if version == self.version:
+            return
+        self.version = version
+
+        positions = layout_tree(self.tree.to_dict())
+
+        # drop items whose node disappeared
+        for node_id in [n for n in self.nodes if n not in positions]:
+            circle, label, _ = self.nodes.pop(node_id)
+            self.scene.removeItem(circle)
+            self.scene.removeItem(label)
+
+        # reuse + move existing items, create only new ones
+        for node_id, (x, y, node) in positions.items():
+            item = self.nodes.get(node_id)
+            if item is None:
+                item = self.nodes[node_id] = self.create_node(node)
+            circle, label, _ = item
+            if circle.pos().x() != x or circle.pos().y() != y:
+                circle.setPos(x, y)
+                label.setPos(x - NODE_RADIUS, y + NODE_RADIUS)
+
+        self.apply_level_of_detail()
+
+    def create_node(self, node):
+        color = COLORS.get(node["type"], QColor("#AAAAAA"))
 
         circle = QGraphicsEllipseItem(
             -NODE_RADIUS, -NODE_RADIUS,
             NODE_RADIUS * 2, NODE_RADIUS * 2
         )
         circle.setBrush(color)
-        circle.setPos(x, y)
         self.scene.addItem(circle)
 
         label = QGraphicsTextItem(node["name"])
         label.setDefaultTextColor(Qt.white)
-        label.setPos(x - NODE_RADIUS, y + NODE_RADIUS)
         self.scene.addItem(label)
 
-        children = node.get("children", [])
-        width = (len(children) - 1) * SIBLING_GAP
-        start_x = x - width / 2
+        return circle, label, node["type"]
+
+    # ---------- level of detail ----------
+    def apply_level_of_detail(self):
+        scale = self.transform().m11()
+        show_labels = scale >= LABEL_MIN_SCALE
+        show_files = scale >= FILE_MIN_SCALE
+        for circle, label, node_type in self.nodes.values():
+            visible = show_files or node_type != "file"
+            circle.setVisible(visible)
+            label.setVisible(visible and show_labels)
 
-        for i, child in enumerate(children):
-            cx = start_x + i * SIBLING_GAP
-            cy = y + LEVEL_GAP
-            self.draw_node(child, cx, cy, depth + 1)
+    def wheelEvent(self, event):
+        factor = 1.15 if event.angleDelta().y() > 0 else 1 / 1.15
+        self.scale(factor, factor)
+        self.apply_level_of_detail()
 
 
 def run_ui(root_dir):